@@ -3,33 +3,87 @@ from mcp.server.fastmcp import FastMCP
 import os
 import json
 import time
-import ast
 import traceback
 import uuid
+import threading
 # Custom Modules
 from utilities.google_sheet_utilities import GoogleSheetUtils
 from utilities.similarity_search_utilities import SimilaritySearchUtilities
-from utilities.train_model_utilties import train_movie_rating_model, predict_rating_of_movie
-
-from Config import SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, RANGE
+from utilities.embedding_registry_utilities import (
+    EMBEDDING_MODEL_REGISTRY, embedding_column_for_model, is_embedding_column, embedding_catalog_version,
+    find_embedding_cell_for_model, parse_embedding, select_embedding_for_model, serialize_embedding,
+)
+from utilities.train_model_utilties import (
+    train_movie_rating_model, predict_rating_of_movie, default_rating_backend, read_distillation_report, rating_model_fingerprint,
+)
+from utilities.prediction_cache_utilities import PredictionCache, normalize_movie_details, prediction_cache_key
+from utilities.transport_utilities import TRANSPORTS, bounded_tool, run_http_server
+from utilities.response_shaping_utilities import ResultCursorStore, parse_fields, shape_item
+from utilities.distillation_utilities import distill_rating_model
+from utilities.training_data_utilities import export_training_snapshot, load_training_snapshot, split_train_validation
+from utilities.embedding_rating_model_utilities import train_embedding_rating_model, compare_rating_models
+from utilities.movie_text_utilities import movie_details_text
+
+from Config import SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, RANGE, TRAINING_MODEL_RESULTS_FOLDER
 
 SERVICE_ACCOUNT_FILE_PATH = SERVICE_ACCOUNT_FILE_PATH
 SPREADSHEET_ID = SPREADSHEET_ID
 RANGE = RANGE
 SHEET_NAME = "movies_list"
+# "int8" or "pq" searches compressed catalog vectors and re-ranks the best candidates exactly; empty searches the float vectors
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "")
+VECTOR_RERANK_CANDIDATES = int(os.environ.get("VECTOR_RERANK_CANDIDATES", "50"))
+# Folder for the memory-mapped float vectors the compressed index re-ranks with; the system temp folder by default
+VECTOR_FLOAT_STORE_FOLDER = os.environ.get("VECTOR_FLOAT_STORE_FOLDER") or None
+# Worker processes for sharded exact search of large catalogs; 0 or 1 searches in this process
+SIMILARITY_SEARCH_WORKERS = int(os.environ.get("SIMILARITY_SEARCH_WORKERS", "0"))
+SHARDED_SEARCH_MIN_DOCUMENTS = int(os.environ.get("SHARDED_SEARCH_MIN_DOCUMENTS", "100000"))
+# Concurrent single-text encode calls are collected for up to ENCODE_MAX_WAIT_MS and encoded as one batch
+ENCODE_MAX_BATCH_SIZE = int(os.environ.get("ENCODE_MAX_BATCH_SIZE", "32"))
+ENCODE_MAX_WAIT_MS = float(os.environ.get("ENCODE_MAX_WAIT_MS", "5"))
+# Versioned Parquet exports of the sheet that training and evaluation read instead of the live sheet
+TRAINING_SNAPSHOT_FOLDER = os.environ.get("TRAINING_SNAPSHOT_FOLDER", os.path.join(os.path.dirname(os.path.abspath(__file__)), "training_snapshots"))
+VALIDATION_FRACTION = float(os.environ.get("VALIDATION_FRACTION", "0.1"))
+# Rating predictions reused across calls until the model that produced them is retrained
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prediction_cache.sqlite3"))
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "10000"))
+# Search hits kept behind a cursor for paging, and the fields shown per hit unless the agent asks for others
+SEARCH_RESULT_CANDIDATES = int(os.environ.get("SEARCH_RESULT_CANDIDATES", "50"))
+DEFAULT_RESULT_FIELDS = ["ID", "Movie Name", "Year", "Genre", "Language", "Director", "Brief Description", "score"]
+
+# "stdio" serves one client per process; "streamable-http" or "sse" serve many clients from one process
+MCP_TRANSPORT = os.environ.get("MCP_TRANSPORT", "stdio")
+MCP_HOST = os.environ.get("MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.environ.get("MCP_PORT", "8503"))
+MCP_GRACEFUL_SHUTDOWN_SECONDS = int(os.environ.get("MCP_GRACEFUL_SHUTDOWN_SECONDS", "30"))
+# Per-tool limits on running and waiting calls; training and indexing tools run one at a time
+TOOL_MAX_CONCURRENCY = int(os.environ.get("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_MAX_PENDING = int(os.environ.get("TOOL_MAX_PENDING", "16"))
 
 # Create an MCP server
-mcp = FastMCP("AI Recommendation System")
+mcp = FastMCP("AI Recommendation System", host=MCP_HOST, port=MCP_PORT)
 
 def row_to_json(row):
-    row_dict = row.drop('Embeddings').to_dict()
+    embedding_columns = [column for column in row.index if is_embedding_column(column)]
+    row_dict = row.drop(embedding_columns).to_dict()
     json_str = json.dumps(row_dict)
     return json_str
 # Add an addition tool
 print("Loading the Model for Similarity Search")
-similarity_search_utilities = SimilaritySearchUtilities()
+similarity_search_utilities = SimilaritySearchUtilities(
+    float_store_folder=VECTOR_FLOAT_STORE_FOLDER, max_batch_size=ENCODE_MAX_BATCH_SIZE, max_wait_ms=ENCODE_MAX_WAIT_MS
+)
 print("Loaded the Model for Similarity Search")
 
+prediction_cache = PredictionCache(PREDICTION_CACHE_PATH, max_entries=PREDICTION_CACHE_MAX_ENTRIES)
+result_cursor_store = ResultCursorStore()
+
+# Rows encoded as one batch and written to the sheet in one call when embedding many documents
+EMBEDDING_FLUSH_ROWS = 256
+# State of the background re-embedding run started by start_embedding_migration
+embedding_migration_lock = threading.Lock()
+embedding_migration_status = {"state": "idle"}
+
 def get_similarity_search_utilities() -> str:
     return "Similarity Search Utilities"
 
@@ -52,6 +106,7 @@ def hello_world() -> str:
 
 # Tool not Working TODO
 @mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
 def generate_and_store_embeddings_for_docs() -> str:
     '''
     Call this tool when the user asks to generate embeddings for documents in Google Sheets and stores them.
@@ -71,31 +126,30 @@ def generate_and_store_embeddings_for_docs() -> str:
             return "No documents found"
 
 
-        # # Only process rows that are missing embeddings or have empty ones
-        df_to_embed = df[df['Embeddings'] == "-"]
+        # # Only process rows that are missing embeddings for the active model
+        model_name = similarity_search_utilities.model_name
+        df_to_embed = df[df.apply(lambda row: select_embedding_for_model(row, model_name) is None, axis=1)]
         print(df_to_embed.shape)
         
 
         # if df_to_embed.empty:
         #     return "All documents already have embeddings"
 
-        for _, row in df_to_embed.iterrows():
+        rows_to_embed = [row for _, row in df_to_embed.iterrows()]
+        for start in range(0, len(rows_to_embed), EMBEDDING_FLUSH_ROWS):
+            batch_rows = rows_to_embed[start:start + EMBEDDING_FLUSH_ROWS]
             try:
-                row_json = row_to_json(row)
                 # TODO: NEED TO REMOVE UNNECESSARY FIELDS FROM THE ROW JSON
-
-                embedding = similarity_search_utilities.generate_embedding(row_json)
-                # print("embedding: ", embedding)
-                if embedding is not None and len(embedding) > 0:
-                    embedding_list = embedding.tolist()
-                    google_sheet_utilities.update_cell_by_id(
-                        id_value=row['ID'],
-                        target_column="Embeddings",
-                        new_value=embedding_list
-                    )
+                # A list is encoded as one batch instead of one queued call per row
+                embeddings = similarity_search_utilities.generate_embedding([row_to_json(row) for row in batch_rows])
+                google_sheet_utilities.update_column_by_id("Embeddings", {
+                    str(row['ID']).strip(): serialize_embedding(model_name, embedding)
+                    for row, embedding in zip(batch_rows, embeddings)
+                    if embedding is not None and len(embedding) > 0
+                })
             except Exception as e:
                 # Log the error or handle it accordingly
-                print(f"Failed to process ID {row['ID']}: {e}")
+                print(f"Failed to process IDs {[row['ID'] for row in batch_rows]}: {e}")
 
         return f"Processed {len(df_to_embed)} documents and stored embeddings"
     except Exception as e:
@@ -105,7 +159,8 @@ def generate_and_store_embeddings_for_docs() -> str:
 
 # Tool Working
 @mcp.tool()
-def get_details_of_movie(user_query: str) -> str:
+@bounded_tool(max_concurrency=TOOL_MAX_CONCURRENCY, max_pending=TOOL_MAX_PENDING)
+def get_details_of_movie(user_query: str, fields: str = "", max_field_chars: int = 200, token_budget: int = 1500, page_size: int = 5) -> str:
     """
     Call this tool when the user asks for details about a movie.
     
@@ -113,17 +168,23 @@ def get_details_of_movie(user_query: str) -> str:
     1. Takes a user query about a movie
     2. Generates embeddings for the query
     3. Performs similarity search to find matching movies
-    4. Returns movie details if found in database
+    4. Returns a compact page of the best matches with a cursor for more results
     5. If not found, searches web and prompts to add to database
     
     Args:
         user_query (str): The user's movie search query or question
+        fields (str): Optional comma separated fields to show per movie, or "all". Defaults to a compact set.
+        max_field_chars (int): Longer field values are truncated to this many characters.
+        token_budget (int): Approximate token limit for the results on this page.
+        page_size (int): Maximum number of movies on this page.
         
     Returns:
         str: Details about the requested movie or status message
 
     """
     try:
+        # A page must hold at least one item, or its cursor would point back at the same offset
+        page_size = max(int(page_size), 1)
         # get all the embeddings from the sheets
         gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
         df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
@@ -131,50 +192,327 @@ def get_details_of_movie(user_query: str) -> str:
         if df.empty:
             return "No documents found"
 
-        # get all the embeddings in a list
-        df['Embeddings'] = df['Embeddings'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-        doc_embeddings_list = df['Embeddings'].tolist()
-        # get all the documents rows in a list except the embeddings column
-        doc_rows_list = df.drop('Embeddings', axis=1).to_dict(orient='records')
+        # get the embeddings produced by the active model, skipping rows that only have vectors from other models
+        model_name = similarity_search_utilities.model_name
+        df['Embeddings'] = df.apply(lambda row: find_embedding_cell_for_model(row, model_name), axis=1)
+        df = df[df['Embeddings'].notnull()]
+        if df.empty:
+            return f"No documents have embeddings for the model '{model_name}'. Generate the embeddings first."
+        # The vectors are only parsed when the search index has to be rebuilt for a new catalog version
+        embedding_cells = df['Embeddings'].tolist()
+        catalog_version = embedding_catalog_version(model_name, df['ID'].tolist(), embedding_cells)
+        load_doc_embeddings = lambda: [parse_embedding(cell)[2] for cell in embedding_cells]
+        # get all the documents rows in a list except the embeddings columns
+        embedding_columns = [column for column in df.columns if is_embedding_column(column)]
+        doc_rows_list = df.drop(embedding_columns, axis=1).to_dict(orient='records')
 
         user_query = user_query.lower()
         # print("user_query_embeddings: ", user_query_embeddings)
 
-        # get the top 5 results
-        top_5_results = similarity_search_utilities.get_top_k_results(user_query, doc_embeddings_list, doc_rows_list, top_k=5)
+        # get the top results, the ones beyond the first page stay behind the cursor
+        top_k_results = similarity_search_utilities.get_top_k_results(
+            user_query, load_doc_embeddings, doc_rows_list, top_k=SEARCH_RESULT_CANDIDATES,
+            quantization=VECTOR_QUANTIZATION, rerank_candidates=VECTOR_RERANK_CANDIDATES,
+            num_workers=SIMILARITY_SEARCH_WORKERS, min_documents_for_sharding=SHARDED_SEARCH_MIN_DOCUMENTS,
+            catalog_version=catalog_version
+        )
+        if top_k_results is None:
+            return "The similarity search failed. Please try again."
+        hits = [
+            dict(document, score=score)
+            for document, score in zip(top_k_results['top_k_documents'], top_k_results['top_k_scores'])
+        ]
+
+        selected_fields = parse_fields(fields, DEFAULT_RESULT_FIELDS)
+        result_id = result_cursor_store.put(hits, fields=selected_fields, max_field_chars=max_field_chars, token_budget=token_budget, page_size=page_size)
+        page = result_cursor_store.page(hits, result_id, 0, selected_fields, max_field_chars, token_budget, page_size)
 
-        prompt = f"Here are the top results generated by the similarity search: {top_5_results['top_k_documents']}. This is the User Query: {user_query}. Please check if the results are relevant to the user query and answer the user query. "
+        prompt = f"Here are the top results generated by the similarity search: {page['items']}. This is the User Query: {user_query}. Please check if the results are relevant to the user query and answer the user query. "
+        if page['next_cursor']:
+            prompt += f"Showing {len(page['items'])} of {page['total']} results. If none of these match, call get_more_results with cursor '{page['next_cursor']}'. "
+        prompt += f"Long fields are truncated; call get_full_movie_details with cursor '{result_id}' and the movie ID for the complete record. "
 
         # If not, then search the web for the details of the movie and return the details to the user. If the results are relevant, then return the details of the movie. If the user wants to add the details to the database, then prompt the user to add the details to the database. If the user wants to add the details to the database, then prompt the user to add the details to the database.
         return prompt
     except Exception as e:
         print(e)
         print(traceback.print_exc())
-        return "Error: " + str(e) + "TRACEBACK: " + traceback.print_exc()
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
 
-# Tool Working
 @mcp.tool()
-def train_the_model() -> str:
+def get_more_results(cursor: str, token_budget: int = 0) -> dict:
     """
-    Call this tool when the user asks to train the model for recommending the movies.
-    
+    Call this tool to fetch the next page of results when a previous tool response gave you a cursor.
+
+    Args:
+        cursor (str): The cursor from the previous response.
+        token_budget (int): Optional approximate token limit for this page. Defaults to the one of the first page.
+
     Returns:
-        str: A message indicating how many documents were processed
+        dict: The results on this page, the total number of results and the cursor for the next page
     """
     try:
+        result_id, offset = result_cursor_store.parse_cursor(cursor)
+        entry = result_cursor_store.get(result_id)
+        if entry is None:
+            return "This cursor has expired. Please run the search again."
+        options = dict(entry["options"])
+        if token_budget:
+            options["token_budget"] = token_budget
+        return result_cursor_store.page(entry["items"], result_id, offset, **options)
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+@bounded_tool(max_concurrency=TOOL_MAX_CONCURRENCY, max_pending=TOOL_MAX_PENDING)
+def get_full_movie_details(cursor: str, movie_id: str) -> dict:
+    """
+    Call this tool when you need every field of a movie from search results, without truncation.
+
+    Args:
+        cursor (str): The cursor given with the search results.
+        movie_id (str): The ID of the movie.
+
+    Returns:
+        dict: The complete record of the movie
+    """
+    try:
+        result_id, _ = result_cursor_store.parse_cursor(cursor)
+        entry = result_cursor_store.get(result_id)
+        records = entry["items"] if entry is not None else []
+        for record in records:
+            if isinstance(record, dict) and str(record.get("ID", "")).strip() == str(movie_id).strip():
+                return shape_item(record, fields=None, max_field_chars=0)
+
+        # Expired cursor: read the record from the sheet instead
         gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
         df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
-        # Check if dataframe is empty
         if df.empty:
             return "No documents found"
-        
-        train_movie_rating_model(data = df)
-        return "Model trained successfully"
+        matches = df[df['ID'].astype(str).str.strip() == str(movie_id).strip()]
+        if matches.empty:
+            return f"No movie found with ID '{movie_id}'"
+        embedding_columns = [column for column in df.columns if is_embedding_column(column)]
+        return matches.drop(embedding_columns, axis=1).iloc[0].to_dict()
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def check_vector_search_recall(quantization: str = "int8", top_k: int = 10) -> dict:
+    """
+    Call this tool when the user asks how accurate the compressed (quantized) vector search is.
+    Compares the compressed index against exact search over the stored embeddings.
+
+    Args:
+        quantization (str): "int8" for scalar quantization or "pq" for product quantization.
+        top_k (int): Number of neighbours compared per query.
+
+    Returns:
+        dict: The recall@k and the compression ratio of the index
+    """
+    try:
+        gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
+        df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
+        if df.empty:
+            return "No documents found"
+
+        model_name = similarity_search_utilities.model_name
+        df['Embeddings'] = df.apply(lambda row: find_embedding_cell_for_model(row, model_name), axis=1)
+        df = df[df['Embeddings'].notnull()]
+        if df.empty:
+            return f"No documents have embeddings for the model '{model_name}'. Generate the embeddings first."
+        embedding_cells = df['Embeddings'].tolist()
+        doc_embeddings_list = [parse_embedding(cell)[2] for cell in embedding_cells]
+
+        return similarity_search_utilities.check_recall(
+            doc_embeddings_list, quantization=quantization, top_k=top_k, rerank_candidates=VECTOR_RERANK_CANDIDATES,
+            catalog_version=embedding_catalog_version(model_name, df['ID'].tolist(), embedding_cells)
+        )
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+def snapshot_the_sheet():
+    gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
+    df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
+    # Check if dataframe is empty
+    if df.empty:
+        return "No documents found"
+
+    return export_training_snapshot(df, TRAINING_SNAPSHOT_FOLDER)
+
+def load_snapshot_for_training(snapshot_version=""):
+    """
+    The training snapshot with the given version, or a fresh snapshot of the sheet when none is given,
+    so every model is trained and evaluated on the same frozen rows.
+
+    Returns:
+        tuple: (snapshot DataFrame, snapshot version), or (message, None) when there is nothing to train on
+    """
+    if not snapshot_version:
+        snapshot_manifest = snapshot_the_sheet()
+        if not isinstance(snapshot_manifest, dict):
+            return snapshot_manifest, None
+        snapshot_version = snapshot_manifest["version"]
+
+    df = load_training_snapshot(TRAINING_SNAPSHOT_FOLDER, version = snapshot_version)
+    # Check if dataframe is empty
+    if df.empty:
+        return "No documents found", None
+    return df, snapshot_version
+
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def create_training_snapshot() -> dict:
+    """
+    Call this tool when the user asks to snapshot or export the training data.
+    Reads the sheet once and stores the training rows as a versioned Parquet dataset.
+
+    Returns:
+        dict: The manifest of the snapshot (version, number of rows)
+    """
+    try:
+        return snapshot_the_sheet()
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+# Tool Working
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def train_the_model(snapshot_version: str = "") -> str:
+    """
+    Call this tool when the user asks to train the model for recommending the movies.
+    Without a snapshot_version the sheet is snapshotted first and the model is trained on that snapshot.
+
+    Args:
+        snapshot_version (str): Optional version of an existing training snapshot to train on.
+    
+    Returns:
+        str: A message indicating how many documents were processed
+    """
+    try:
+        df, snapshot_version = load_snapshot_for_training(snapshot_version)
+        if snapshot_version is None:
+            return df
+
+        train_df, validation_df = split_train_validation(df, validation_fraction = VALIDATION_FRACTION)
+        metrics = train_movie_rating_model(data = train_df, validation_data = validation_df)
+        prediction_cache.clear()
+        return f"Model trained successfully on snapshot {snapshot_version} ({len(train_df)} training rows, {len(validation_df)} validation rows). Validation metrics: {metrics}"
     except Exception as e:
         print(e)
         print(traceback.print_exc())
         return "Error: " + str(e) + "TRACEBACK: " + traceback.print_exc()
 
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def train_the_embedding_rating_model(estimator: str = "ridge", snapshot_version: str = "") -> dict:
+    """
+    Call this tool when the user asks to train the lightweight rating model.
+    Trains a small regressor over embeddings of the movie details (without the rating) and numeric columns on CPU.
+    Without a snapshot_version the sheet is snapshotted first and the model is trained on that snapshot.
+
+    Args:
+        estimator (str): "ridge", "gbdt" or "mlp".
+        snapshot_version (str): Optional version of an existing training snapshot to train on.
+
+    Returns:
+        dict: The training size, training time and validation error
+    """
+    try:
+        df, snapshot_version = load_snapshot_for_training(snapshot_version)
+        if snapshot_version is None:
+            return df
+
+        train_df, validation_df = split_train_validation(df, validation_fraction = VALIDATION_FRACTION)
+        report = train_embedding_rating_model(
+            train_df, similarity_search_utilities.generate_embedding, similarity_search_utilities.model_name,
+            TRAINING_MODEL_RESULTS_FOLDER, estimator = estimator, validation_data = validation_df
+        )
+        prediction_cache.clear()
+        return dict(report, snapshot_version = snapshot_version)
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def compare_the_rating_models(snapshot_version: str = "") -> dict:
+    """
+    Call this tool when the user asks to compare the BERT rating model with the lightweight embedding rating model.
+    Pass the snapshot_version the models were trained on; without one the sheet is snapshotted first.
+
+    Args:
+        snapshot_version (str): Optional version of an existing training snapshot to evaluate on.
+
+    Returns:
+        dict: Error (MAE, RMSE) and mean prediction latency of both models on the validation rows
+    """
+    try:
+        df, snapshot_version = load_snapshot_for_training(snapshot_version)
+        if snapshot_version is None:
+            return df
+
+        _, validation_df = split_train_validation(df, validation_fraction = VALIDATION_FRACTION)
+        report = compare_rating_models(
+            validation_df, similarity_search_utilities.generate_embedding, TRAINING_MODEL_RESULTS_FOLDER,
+            predict_with_bert = lambda movie_details: predict_rating_of_movie(movie_details, backend = "bert")
+        )
+        return dict(report, snapshot_version = snapshot_version)
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def distill_the_rating_model(snapshot_version: str = "") -> dict:
+    """
+    Call this tool when the user asks to distill or compress the rating model.
+    Trains a small student model from the fine-tuned BERT model, which is then used for predictions by default.
+    Without a snapshot_version the sheet is snapshotted first and the student is distilled on that snapshot.
+
+    Args:
+        snapshot_version (str): Optional version of an existing training snapshot to distill on.
+
+    Returns:
+        dict: The distillation report, including the student's agreement with the teacher
+    """
+    try:
+        df, snapshot_version = load_snapshot_for_training(snapshot_version)
+        if snapshot_version is None:
+            return df
+
+        report = distill_rating_model(df)
+        prediction_cache.clear()
+        return dict(report, snapshot_version = snapshot_version)
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+def get_rating_model_agreement() -> dict:
+    """
+    Call this tool when the user asks which rating model is used or how closely the distilled model agrees with BERT.
+
+    Returns:
+        dict: The rating model in use and the last distillation report
+    """
+    return {
+        "rating_backend": default_rating_backend(),
+        "distillation_report": read_distillation_report() or "No distilled model yet",
+    }
+
 # Tool Working
 @mcp.tool()
 def rate_the_movie(movie_details_information) -> dict:
@@ -236,17 +574,39 @@ def rate_the_movie(movie_details_information) -> dict:
 
 # Tool Working
 @mcp.tool()
-def provide_the_reviews_for_the_movie(movie_details) -> str:
+@bounded_tool(max_concurrency=TOOL_MAX_CONCURRENCY, max_pending=TOOL_MAX_PENDING)
+def provide_the_reviews_for_the_movie(movie_details, rating_backend: str = "", max_review_chars: int = 300, token_budget: int = 1000, page_size: int = 10) -> str:
     """
     Args:
         movie_details (dict): The details of the movie
+        rating_backend (str): Optional rating model, "student", "bert" or "embedding". Defaults to the server setting.
+        max_review_chars (int): Longer reviews are truncated to this many characters.
+        token_budget (int): Approximate token limit for the reviews included.
+        page_size (int): Maximum number of reviews included.
 
     Returns:
         str: A message indicating how many documents were processed
     
     """
     try:
-        predicted_rating = predict_rating_of_movie(movie_details)
+        # A page must hold at least one item, or its cursor would point back at the same offset
+        page_size = max(int(page_size), 1)
+        # The cache key and the prediction both use the normalized details, so a cache hit equals a recomputation
+        movie_details = normalize_movie_details(movie_details)
+        rating_backend = rating_backend or default_rating_backend()
+        model_fingerprint = rating_model_fingerprint(rating_backend)
+        if rating_backend == "embedding":
+            model_fingerprint += f":{similarity_search_utilities.model_name}"
+        cache_key = prediction_cache_key(movie_details, model_fingerprint)
+
+        predicted_rating = prediction_cache.get(cache_key)
+        if predicted_rating is None:
+            embedding = None
+            if rating_backend == "embedding":
+                # Same rating-free text the embedding rating model was trained on
+                embedding = similarity_search_utilities.generate_embedding(movie_details_text(movie_details))
+            predicted_rating = predict_rating_of_movie(movie_details, backend = rating_backend, embedding = embedding)
+            prediction_cache.put(cache_key, predicted_rating, model_fingerprint)
 
         gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
         df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
@@ -257,12 +617,19 @@ def provide_the_reviews_for_the_movie(movie_details) -> str:
         df['User Rating'] = df['User Rating'].astype(float)
         rounded_rating = round(predicted_rating, 2)
         filtered_df = df[(df['User Rating'] >= rounded_rating - 1) & (df['User Rating'] <= rounded_rating)]
-        list_of_reviews_provided_by_user = filtered_df['User Liking (words)'].tolist()
+        # Closest ratings first, so the reviews that fit the budget are the most comparable ones
+        filtered_df = filtered_df.iloc[(filtered_df['User Rating'] - rounded_rating).abs().argsort()]
+        reviews = filtered_df['User Liking (words)'].tolist()
+
+        result_id = result_cursor_store.put(reviews, fields=None, max_field_chars=max_review_chars, token_budget=token_budget, page_size=page_size)
+        page = result_cursor_store.page(reviews, result_id, 0, None, max_review_chars, token_budget, page_size)
+        list_of_reviews_provided_by_user = page['items']
+        more_reviews = f" ({len(page['items'])} of {page['total']} reviews shown, call get_more_results with cursor '{page['next_cursor']}' for more)" if page['next_cursor'] else ""
 
 
         return f"""The user has not seen or rated the movie , but is considering watching it. A machine learning model has predicted that the user would rate this movie {predicted_rating} out of 10. 
         
-        You are also given a list of past reviews by the same user for other movies that fall within a similar rating range (e.g., within ±0.5 of the predicted rating). for example: {list_of_reviews_provided_by_user}
+        You are also given a list of past reviews by the same user for other movies that fall within a similar rating range (e.g., within ±0.5 of the predicted rating). for example: {list_of_reviews_provided_by_user}{more_reviews}
         
         Based on this predicted rating and the user's review history of similar movies, determine whether the user is likely to enjoy the movie and whether they should watch it. Justify your answer clearly and briefly, referencing the users review patterns. Do not generate a generic movie review. This is a personalized recommendation, not a film critique."""
     except Exception as e:
@@ -359,6 +726,7 @@ def add_document_to_database(movie_details_information) -> dict:
 
 
 @mcp.tool()
+@bounded_tool(max_concurrency=TOOL_MAX_CONCURRENCY, max_pending=TOOL_MAX_PENDING)
 def process_document_for_database(movie_details):
     """
     Call this tool when the user tells you to add the details of the movie to the database.
@@ -396,10 +764,10 @@ def process_document_for_database(movie_details):
         movie_details = json.dumps(movie_details)
         embedding = similarity_search_utilities.generate_embedding(movie_details)
         if embedding is not None and len(embedding) > 0:
-                embedding_list = embedding.tolist()
+                embedding_value = serialize_embedding(similarity_search_utilities.model_name, embedding)
 
         movie_details = dict(json.loads(movie_details))
-        movie_details['Embeddings'] = embedding_list
+        movie_details['Embeddings'] = embedding_value
         # UUID
         unique_id = uuid.uuid4()
         movie_details['ID'] = str(unique_id)
@@ -440,10 +808,128 @@ def process_document_for_database(movie_details):
         return "Error: " + str(e) + "TRACEBACK: " + traceback.print_exc()
 
 
+def run_embedding_migration(target_model_name):
+    """
+    Re-embed every row with the target model into a side-by-side column.
+    Search keeps using the active model's vectors until switch_embedding_model is called.
+    """
+    try:
+        target_utilities = SimilaritySearchUtilities(model_name=target_model_name)
+        target_column = embedding_column_for_model(target_model_name)
+        gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
+        df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
+
+        rows_to_embed = [row for _, row in df.iterrows() if select_embedding_for_model(row, target_model_name) is None]
+        embedding_migration_status.update({"total": len(rows_to_embed), "processed": 0})
+
+        for start in range(0, len(rows_to_embed), EMBEDDING_FLUSH_ROWS):
+            batch_rows = rows_to_embed[start:start + EMBEDDING_FLUSH_ROWS]
+            embeddings = target_utilities.generate_embedding([row_to_json(row) for row in batch_rows])
+            # Only this batch is written; rows flushed earlier keep the values already in the sheet
+            values_by_id = {
+                str(row['ID']).strip(): serialize_embedding(target_model_name, embedding)
+                for row, embedding in zip(batch_rows, embeddings)
+            }
+            updated_rows = gsheet.update_column_by_id(target_column, values_by_id)
+            # update_column_by_id returns 0 on API errors instead of raising
+            if updated_rows < len(values_by_id):
+                embedding_migration_status.update({
+                    "state": "failed",
+                    "error": f"Wrote {updated_rows} of {len(values_by_id)} embeddings in the batch starting at row {start}",
+                })
+                return
+            embedding_migration_status["processed"] = start + len(batch_rows)
+
+        embedding_migration_status["state"] = "completed"
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        embedding_migration_status.update({"state": "failed", "error": str(e)})
+
+@mcp.tool()
+def start_embedding_migration(target_model_name: str) -> str:
+    """
+    Call this tool when the user asks to switch the embedding model or re-embed the documents with another model.
+    The documents are re-embedded in the background while search keeps using the current model.
+    Once it completes, call "switch_embedding_model" to start searching with the new vectors.
+
+    Args:
+        target_model_name (str): Name of a registered embedding model.
+
+    Returns:
+        str: A message indicating whether the migration was started
+    """
+    try:
+        if target_model_name not in EMBEDDING_MODEL_REGISTRY:
+            return f"Unknown embedding model '{target_model_name}'. Registered models: {list(EMBEDDING_MODEL_REGISTRY.keys())}"
+        with embedding_migration_lock:
+            if embedding_migration_status.get("state") == "running":
+                return f"A migration to '{embedding_migration_status['target_model']}' is already running"
+            embedding_migration_status.clear()
+            embedding_migration_status.update({"state": "running", "target_model": target_model_name, "total": 0, "processed": 0})
+        threading.Thread(target=run_embedding_migration, args=(target_model_name,), daemon=True).start()
+        return f"Started re-embedding the documents with '{target_model_name}'"
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
+@mcp.tool()
+def get_embedding_migration_status() -> dict:
+    """
+    Call this tool when the user asks about the progress of the embedding migration.
+
+    Returns:
+        dict: The state of the migration along with the processed and total number of documents
+    """
+    return dict(embedding_migration_status, active_model=similarity_search_utilities.model_name)
+
+@mcp.tool()
+@bounded_tool(max_concurrency=1, max_pending=0)
+def switch_embedding_model(model_name: str) -> str:
+    """
+    Call this tool when the user asks to start using another embedding model for search.
+    Switching is refused while some documents have no vector for the new model, so results never mix models.
+
+    Args:
+        model_name (str): Name of a registered embedding model.
+
+    Returns:
+        str: A message indicating whether the model was switched
+    """
+    global similarity_search_utilities
+    try:
+        if model_name not in EMBEDDING_MODEL_REGISTRY:
+            return f"Unknown embedding model '{model_name}'. Registered models: {list(EMBEDDING_MODEL_REGISTRY.keys())}"
+        gsheet = GoogleSheetUtils(SERVICE_ACCOUNT_FILE_PATH, SPREADSHEET_ID, SHEET_NAME)
+        df = gsheet.read_range(range_name = RANGE, as_dataframe = True)
+        missing = int(df.apply(lambda row: select_embedding_for_model(row, model_name) is None, axis=1).sum()) if not df.empty else 0
+        if missing:
+            return f"{missing} documents have no embeddings for '{model_name}'. Run start_embedding_migration first."
+
+        similarity_search_utilities.close()
+        similarity_search_utilities = SimilaritySearchUtilities(
+            model_name=model_name, float_store_folder=VECTOR_FLOAT_STORE_FOLDER,
+            max_batch_size=ENCODE_MAX_BATCH_SIZE, max_wait_ms=ENCODE_MAX_WAIT_MS
+        )
+        os.environ["EMBEDDING_MODEL"] = model_name
+        return f"Switched the embedding model to '{model_name}'. Set EMBEDDING_MODEL={model_name} to keep it after a restart."
+    except Exception as e:
+        print(e)
+        print(traceback.print_exc())
+        return "Error: " + str(e) + "TRACEBACK: " + traceback.format_exc()
+
 
 if __name__ == "__main__":
-    print("Starting MCP server...")
-    mcp.run(transport="stdio")
+    if MCP_TRANSPORT not in TRANSPORTS:
+        raise ValueError(f"Unknown MCP_TRANSPORT '{MCP_TRANSPORT}'. Supported transports: {TRANSPORTS}")
+    print(f"Starting MCP server ({MCP_TRANSPORT})...")
+    if MCP_TRANSPORT == "stdio":
+        mcp.run(transport="stdio")
+    else:
+        # One process and one copy of the models shared by every connected session
+        print(f"Listening on {MCP_HOST}:{MCP_PORT}")
+        run_http_server(mcp, transport=MCP_TRANSPORT, graceful_shutdown_seconds=MCP_GRACEFUL_SHUTDOWN_SECONDS)
 
     # # Prevent exit by sleeping indefinitely
     # while True:
@@ -0,0 +1,146 @@
+import os
+os.environ['WANDB_DISABLED'] = 'true'
+
+import json
+import time
+import random
+import numpy as np
+import torch
+from transformers import BertForSequenceClassification, BertTokenizer, Trainer, TrainingArguments
+
+# Custom Modules
+from Config import TRAINING_MODEL_RESULTS_FOLDER, TRAINING_MODEL_LOGS_FOLDER
+from utilities.train_model_utilties import (
+    RatingsDataset, row_to_text, load_rating_model, checkpoint_fingerprint,
+    STUDENT_MODEL_FOLDER, DISTILLATION_REPORT_FILE,
+)
+from utilities.movie_text_utilities import MOVIE_DETAIL_COLUMNS, details_to_text
+from utilities.training_data_utilities import split_train_validation
+
+# 4 layers, 256 hidden (~11M parameters instead of ~110M), same uncased vocabulary as the teacher
+STUDENT_BASE_MODEL = os.environ.get("STUDENT_BASE_MODEL", "google/bert_uncased_L-4_H-256_A-4")
+STUDENT_MAX_LENGTH = 128
+
+
+def augment_movie_texts(data, copies_per_row=3, field_drop_probability=0.3, seed=42):
+    """
+    Partial versions of each catalog row, formatted the way the agent's calls reach predict_rating_of_movie:
+    some fields missing and no 'User Liking (words)'. The movie name is always kept.
+    """
+    random_state = random.Random(seed)
+    texts = []
+    for _, row in data.iterrows():
+        for _ in range(copies_per_row):
+            details = {
+                column: row.get(column, "")
+                for column in MOVIE_DETAIL_COLUMNS
+                if column == "Movie Name" or random_state.random() > field_drop_probability
+            }
+            texts.append(details_to_text(details))
+    return texts
+
+
+def movie_texts(data, seed=42):
+    """The full text of each row (training snapshots already carry it) followed by its augmented partial versions."""
+    texts = [row["input_text"] if "input_text" in row else row_to_text(row) for _, row in data.iterrows()]
+    return texts + augment_movie_texts(data, seed=seed)
+
+
+def predict_texts(tokenizer, model, texts, max_length, batch_size=16):
+    predictions = []
+    with torch.no_grad():
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(
+                texts[start:start + batch_size], return_tensors="pt", truncation=True, padding=True, max_length=max_length
+            )
+            predictions.extend(model(**inputs).logits.reshape(-1).tolist())
+    return np.array(predictions, dtype=np.float32)
+
+
+def _mean_latency_ms(tokenizer, model, texts, max_length):
+    start = time.perf_counter()
+    for text in texts:
+        predict_texts(tokenizer, model, [text], max_length)
+    return (time.perf_counter() - start) / len(texts) * 1000
+
+
+def distill_rating_model(data, teacher_folder=TRAINING_MODEL_RESULTS_FOLDER, student_folder=STUDENT_MODEL_FOLDER,
+                         num_train_epochs=5, holdout_fraction=0.1, seed=42):
+    """
+    Train a small BERT student to reproduce the fine-tuned teacher's ratings on catalog rows and augmented
+    partial inputs, save it with a report of how closely it agrees with the teacher on the texts of held-out movies.
+
+    Returns:
+        dict: The distillation report
+    """
+    teacher_tokenizer, teacher_model = load_rating_model(teacher_folder)
+    # Movies are split before their texts are built, so no held-out text has a sibling from the same movie in training
+    train_rows, holdout_rows = split_train_validation(data, validation_fraction=holdout_fraction, seed=seed)
+    train_texts = movie_texts(train_rows, seed=seed)
+    random.Random(seed).shuffle(train_texts)
+    holdout_texts = movie_texts(holdout_rows, seed=seed)
+
+    teacher_ratings = predict_texts(teacher_tokenizer, teacher_model, train_texts + holdout_texts, max_length=512)
+    train_ratings = teacher_ratings[:len(train_texts)]
+
+    student_tokenizer = BertTokenizer.from_pretrained(
+        teacher_folder if os.path.exists(os.path.join(teacher_folder, "vocab.txt")) else "bert-base-uncased",
+        model_max_length=STUDENT_MAX_LENGTH,
+    )
+    student_model = BertForSequenceClassification.from_pretrained(
+        STUDENT_BASE_MODEL,
+        num_labels=1,  # Regression on the teacher's ratings (MSE on the logits)
+        problem_type="regression"
+    )
+
+    encodings = student_tokenizer(train_texts, truncation=True, padding=True, max_length=STUDENT_MAX_LENGTH)
+    dataset = RatingsDataset(encodings, train_ratings.tolist())
+
+    training_args = TrainingArguments(
+        output_dir=student_folder,
+        num_train_epochs=num_train_epochs,
+        per_device_train_batch_size=32,
+        learning_rate=1e-4,
+        warmup_steps=10,
+        weight_decay=0.01,
+        logging_dir=TRAINING_MODEL_LOGS_FOLDER,
+        logging_steps=10,
+        save_strategy="no",
+        seed=seed
+    )
+    trainer = Trainer(model=student_model, args=training_args, train_dataset=dataset)
+    trainer.train()
+    student_model.eval()
+
+    report = {
+        "student_base_model": STUDENT_BASE_MODEL,
+        "student_max_length": STUDENT_MAX_LENGTH,
+        "teacher_parameters": sum(parameter.numel() for parameter in teacher_model.parameters()),
+        "student_parameters": sum(parameter.numel() for parameter in student_model.parameters()),
+        "training_texts": len(train_texts),
+        "holdout_texts": len(holdout_texts),
+        "holdout_movies": len(holdout_rows),
+        "teacher_fingerprint": checkpoint_fingerprint(teacher_folder),
+    }
+    if holdout_texts:
+        holdout_teacher = teacher_ratings[len(train_texts):]
+        holdout_student = predict_texts(student_tokenizer, student_model, holdout_texts, STUDENT_MAX_LENGTH)
+        differences = holdout_student - holdout_teacher
+        latency_texts = holdout_texts[:20]
+        report.update({
+            "agreement_mae": round(float(np.abs(differences).mean()), 4),
+            "agreement_max_abs_difference": round(float(np.abs(differences).max()), 4),
+            "agreement_correlation": round(float(np.corrcoef(holdout_student, holdout_teacher)[0, 1]), 4) if len(holdout_texts) > 1 else None,
+            "teacher_latency_ms": round(_mean_latency_ms(teacher_tokenizer, teacher_model, latency_texts, 512), 2),
+            "student_latency_ms": round(_mean_latency_ms(student_tokenizer, student_model, latency_texts, STUDENT_MAX_LENGTH), 2),
+        })
+
+    # The report goes last: its teacher fingerprint is what makes the student the default backend
+    report_path = os.path.join(student_folder, DISTILLATION_REPORT_FILE)
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    trainer.save_model(student_folder)
+    student_tokenizer.save_pretrained(student_folder)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
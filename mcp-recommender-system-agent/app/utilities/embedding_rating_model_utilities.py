@@ -0,0 +1,179 @@
+import os
+import time
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.neural_network import MLPRegressor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Custom Modules
+from utilities.movie_text_utilities import MOVIE_DETAIL_COLUMNS, movie_details_text
+
+EMBEDDING_RATING_MODEL_FILE = "embedding_rating_model.joblib"
+NUMERIC_COLUMNS = ["Year", "Timing(min)", "Budget in Rupees", "Revenue in Rupees"]
+# Money columns span several orders of magnitude, so they are log-scaled
+LOG_SCALED_COLUMNS = {"Budget in Rupees", "Revenue in Rupees"}
+
+ESTIMATORS = {
+    "ridge": lambda: Ridge(alpha=1.0),
+    "gbdt": lambda: HistGradientBoostingRegressor(max_iter=200, learning_rate=0.05, random_state=42),
+    "mlp": lambda: MLPRegressor(hidden_layer_sizes=(128,), alpha=1e-3, max_iter=500, random_state=42),
+}
+
+
+def _to_number(value):
+    try:
+        return float(str(value).replace(",", "").strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _row_label(row):
+    # Training snapshots carry the rating as "label", sheet rows as "User Rating"
+    return _to_number(row["label"] if "label" in row else row.get("User Rating", ""))
+
+
+def numeric_features(movie_details):
+    """Numeric columns plus a missing-value flag for each, so empty fields do not look like zero."""
+    features = []
+    for column in NUMERIC_COLUMNS:
+        value = _to_number(movie_details.get(column, ""))
+        if column in LOG_SCALED_COLUMNS and not np.isnan(value):
+            value = np.log1p(max(value, 0.0))
+        features.extend([0.0 if np.isnan(value) else value, float(np.isnan(value))])
+    return np.array(features, dtype=np.float32)
+
+
+def build_features(embedding, movie_details):
+    embedding = np.asarray(embedding, dtype=np.float32)
+    embedding = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+    return np.concatenate([embedding, numeric_features(movie_details)])
+
+
+def _features_and_labels(data, encode_function):
+    rows, labels = [], []
+    for _, row in data.iterrows():
+        label = _row_label(row)
+        if not np.isnan(label):
+            rows.append(row)
+            labels.append(label)
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32), np.array(labels, dtype=np.float32)
+    # The stored search vectors embed the whole row, rating and liking text included, so they are not reused
+    embeddings = encode_function([movie_details_text(row) for row in rows])
+    features = [build_features(embedding, row) for row, embedding in zip(rows, embeddings)]
+    return np.array(features, dtype=np.float32), np.array(labels, dtype=np.float32)
+
+
+def train_embedding_rating_model(data, encode_function, embedding_model_name, model_folder, estimator="ridge", validation_data=None):
+    """
+    Fit a small regressor on embeddings of the rating-free movie details (movie_details_text) plus the numeric columns.
+    encode_function turns a list of texts into embeddings; predictions must embed movie_details_text with the same model.
+
+    Returns:
+        dict: Training size and, when validation_data is given, the validation error
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator '{estimator}'. Supported estimators: {list(ESTIMATORS.keys())}")
+    features, labels = _features_and_labels(data, encode_function)
+    if len(labels) == 0:
+        raise ValueError("No rated rows to train the embedding rating model on")
+
+    pipeline = make_pipeline(StandardScaler(), ESTIMATORS[estimator]())
+    start = time.perf_counter()
+    pipeline.fit(features, labels)
+    training_seconds = time.perf_counter() - start
+
+    os.makedirs(model_folder, exist_ok=True)
+    joblib.dump({
+        "pipeline": pipeline,
+        "estimator": estimator,
+        "embedding_model": embedding_model_name,
+        "numeric_columns": NUMERIC_COLUMNS,
+        "text_columns": MOVIE_DETAIL_COLUMNS,
+    }, os.path.join(model_folder, EMBEDDING_RATING_MODEL_FILE))
+    _loaded_models.pop(model_folder, None)
+
+    report = {"estimator": estimator, "training_rows": int(len(labels)), "training_seconds": round(training_seconds, 3)}
+    if validation_data is not None and len(validation_data) > 0:
+        validation_features, validation_labels = _features_and_labels(validation_data, encode_function)
+        if len(validation_labels):
+            errors = pipeline.predict(validation_features) - validation_labels
+            report.update({
+                "validation_rows": int(len(validation_labels)),
+                "validation_mae": round(float(np.abs(errors).mean()), 4),
+                "validation_rmse": round(float(np.sqrt((errors ** 2).mean())), 4),
+            })
+    return report
+
+
+# model_folder -> (file modification time, saved model)
+_loaded_models = {}
+
+
+def load_embedding_rating_model(model_folder):
+    model_path = os.path.join(model_folder, EMBEDDING_RATING_MODEL_FILE)
+    modified_time = os.path.getmtime(model_path)
+    cached = _loaded_models.get(model_folder)
+    if cached is None or cached[0] != modified_time:
+        cached = (modified_time, joblib.load(model_path))
+        _loaded_models[model_folder] = cached
+    return cached[1]
+
+
+def predict_rating_with_embedding_model(movie_details, embedding, model_folder):
+    """embedding is the encoding of movie_details_text(movie_details), by the model the regressor was trained with."""
+    saved_model = load_embedding_rating_model(model_folder)
+    if "text_columns" not in saved_model:
+        raise ValueError("The embedding rating model was trained on the stored catalog vectors. Retrain it with train_the_embedding_rating_model")
+    features = build_features(embedding, movie_details).reshape(1, -1)
+    expected_features = saved_model["pipeline"].n_features_in_
+    if features.shape[1] != expected_features:
+        raise ValueError(f"The embedding rating model was trained on '{saved_model['embedding_model']}' vectors, which do not match this embedding")
+    return float(saved_model["pipeline"].predict(features)[0])
+
+
+def compare_rating_models(validation_data, encode_function, model_folder, predict_with_bert):
+    """
+    Error and per-prediction latency of the BERT regressor and the embedding model on the same validation rows.
+    Both models get only the rating-free movie details, and the embedding model's latency includes encoding them.
+    """
+    bert_errors, embedding_errors = [], []
+    bert_seconds, embedding_seconds = [], []
+
+    for _, row in validation_data.iterrows():
+        label = _row_label(row)
+        if np.isnan(label):
+            continue
+        movie_details = {column: row.get(column, "") for column in MOVIE_DETAIL_COLUMNS}
+
+        start = time.perf_counter()
+        bert_prediction = predict_with_bert(movie_details)
+        bert_seconds.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        embedding = encode_function([movie_details_text(movie_details)])[0]
+        embedding_prediction = predict_rating_with_embedding_model(movie_details, embedding, model_folder)
+        embedding_seconds.append(time.perf_counter() - start)
+
+        bert_errors.append(bert_prediction - label)
+        embedding_errors.append(embedding_prediction - label)
+
+    if not bert_errors:
+        return {"rows": 0}
+
+    def summary(errors, seconds):
+        errors = np.array(errors)
+        return {
+            "mae": round(float(np.abs(errors).mean()), 4),
+            "rmse": round(float(np.sqrt((errors ** 2).mean())), 4),
+            "mean_latency_ms": round(float(np.mean(seconds)) * 1000, 3),
+        }
+
+    return {
+        "rows": len(bert_errors),
+        "bert": summary(bert_errors, bert_seconds),
+        "embedding": summary(embedding_errors, embedding_seconds),
+    }
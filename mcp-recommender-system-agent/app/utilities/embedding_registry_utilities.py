@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import hashlib
+
+# Vectors written before the registry existed are bare lists produced by this model
+LEGACY_EMBEDDING_MODEL = "all-mpnet-base-v2"
+EMBEDDINGS_COLUMN = "Embeddings"
+EMBEDDINGS_COLUMN_PREFIX = "Embeddings"
+# serialize_embedding writes the model and dimension first, so they can be read without parsing the vector
+_EMBEDDING_HEADER = re.compile(r'\s*\{"model":\s*"((?:[^"\\]|\\.)*)",\s*"dim":\s*(\d+)')
+
+# name -> how to load the encoder and the dimension of the vectors it stores
+# truncate_dim keeps only the leading dimensions (Matryoshka-style truncation)
+EMBEDDING_MODEL_REGISTRY = {
+    "all-mpnet-base-v2": {
+        "path": "all-mpnet-base-v2",
+        "dimension": 768,
+        "truncate_dim": None,
+    },
+    "all-mpnet-base-v2-256": {
+        "path": "all-mpnet-base-v2",
+        "dimension": 256,
+        "truncate_dim": 256,
+    },
+    "all-MiniLM-L6-v2": {
+        "path": os.environ.get("MINILM_MODEL_PATH", "all-MiniLM-L6-v2"),
+        "dimension": 384,
+        "truncate_dim": None,
+    },
+}
+
+
+def register_embedding_model(name, path, dimension, truncate_dim=None):
+    """
+    Register an encoder (hub name or local folder) under a name that is stored with every vector it produces.
+    """
+    if truncate_dim is not None and truncate_dim != dimension:
+        raise ValueError(f"truncate_dim ({truncate_dim}) must match dimension ({dimension})")
+    EMBEDDING_MODEL_REGISTRY[name] = {
+        "path": path,
+        "dimension": dimension,
+        "truncate_dim": truncate_dim,
+    }
+
+
+def get_embedding_model_spec(name):
+    if name not in EMBEDDING_MODEL_REGISTRY:
+        raise ValueError(f"Unknown embedding model '{name}'. Registered models: {list(EMBEDDING_MODEL_REGISTRY.keys())}")
+    return EMBEDDING_MODEL_REGISTRY[name]
+
+
+def get_active_embedding_model():
+    return os.environ.get("EMBEDDING_MODEL", LEGACY_EMBEDDING_MODEL)
+
+
+def embedding_column_for_model(model_name):
+    """Column that holds the side-by-side copy of the vectors while migrating to model_name."""
+    return f"{EMBEDDINGS_COLUMN_PREFIX} [{model_name}]"
+
+
+def is_embedding_column(column_name):
+    return str(column_name).startswith(EMBEDDINGS_COLUMN_PREFIX)
+
+
+def serialize_embedding(model_name, embedding):
+    """Tag a vector with the model and dimension that produced it, ready to be stored in a sheet cell."""
+    vector = embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+    return json.dumps({
+        "model": model_name,
+        "dim": len(vector),
+        "vector": vector,
+    })
+
+
+def parse_embedding(value):
+    """
+    Parse a stored cell into a (model_name, dimension, vector) tuple.
+    Bare lists written before the registry existed are attributed to LEGACY_EMBEDDING_MODEL.
+    Returns None for empty or placeholder cells.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value in ("", "-"):
+            return None
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return None
+    if isinstance(value, dict):
+        vector = value.get("vector") or []
+        return value.get("model", LEGACY_EMBEDDING_MODEL), int(value.get("dim", len(vector))), vector
+    if isinstance(value, (list, tuple)) and len(value) > 0:
+        return LEGACY_EMBEDDING_MODEL, len(value), list(value)
+    return None
+
+
+def embedding_cell_header(value):
+    """
+    The (model_name, dimension) of a stored cell without parsing its vector, or None for empty cells.
+    """
+    if isinstance(value, str):
+        match = _EMBEDDING_HEADER.match(value)
+        if match:
+            return json.loads(f'"{match.group(1)}"'), int(match.group(2))
+        stripped = value.strip()
+        if stripped.startswith("[") and stripped != "[]":
+            return LEGACY_EMBEDDING_MODEL, stripped.count(",") + 1
+    parsed = parse_embedding(value)
+    return parsed[:2] if parsed is not None else None
+
+
+def find_embedding_cell_for_model(row, model_name):
+    """Return the stored cell holding model_name's vector in any of the row's embedding columns, or None."""
+    expected_dimension = get_embedding_model_spec(model_name)["dimension"]
+    for column_name, value in row.items():
+        if is_embedding_column(column_name) and embedding_cell_header(value) == (model_name, expected_dimension):
+            return value
+    return None
+
+
+def select_embedding_for_model(row, model_name):
+    """
+    Return the vector stored for model_name in any of the row's embedding columns, or None.
+    Rows without a matching vector are left out of search instead of mixing models.
+    """
+    value = find_embedding_cell_for_model(row, model_name)
+    if value is None:
+        return None
+    parsed = parse_embedding(value)
+    return parsed[2] if parsed is not None else None
+
+
+def embedding_catalog_version(model_name, ids, cells):
+    """
+    Cheap version of a catalog's vectors: changes when rows are added, removed or re-embedded,
+    without hashing the vectors themselves.
+    """
+    digest = hashlib.sha1(model_name.encode("utf-8"))
+    for row_id, cell in zip(ids, cells):
+        digest.update(f"\x00{str(row_id).strip()}:{len(str(cell))}".encode("utf-8"))
+    return digest.hexdigest()
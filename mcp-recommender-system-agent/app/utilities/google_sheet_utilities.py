@@ -202,6 +202,66 @@ class GoogleSheetUtils:
             print(f"ID: {id_value}, Column: {target_column}, Value type: {type(new_value)}, Value: {new_value}")
             return False
 
+    def update_column_by_id(self, target_column, values_by_id, id_column="ID"):
+        """
+        Update many cells of one column in a single write, matching rows by ID.
+        The column is added to the header row if it does not exist yet.
+
+        Args:
+            target_column (str): The column to update.
+            values_by_id (dict): Maps ID values to the new cell values (converted to string).
+            id_column (str): The name of the column containing unique IDs.
+
+        Returns:
+            int: The number of rows updated.
+        """
+        try:
+            header_result = self.service.spreadsheets().values().get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"'{self.sheet_name}'!1:1"
+            ).execute()
+            headers = header_result.get("values", [[]])[0]
+            if not headers:
+                print("Sheet is empty.")
+                return 0
+            if id_column not in headers:
+                print(f"ID column '{id_column}' not found. Available columns: {headers}")
+                return 0
+            if target_column not in headers:
+                headers = headers + [target_column]
+                header_letter = self.col_index_to_letter(len(headers))
+                self.write_range(f"{self.sheet_name}!{header_letter}1", [[target_column]])
+
+            # Only the ID column is read, and only the updated cells are written
+            id_letter = self.col_index_to_letter(headers.index(id_column) + 1)
+            col_letter = self.col_index_to_letter(headers.index(target_column) + 1)
+            id_result = self.service.spreadsheets().values().get(
+                spreadsheetId=self.spreadsheet_id,
+                range=f"'{self.sheet_name}'!{id_letter}2:{id_letter}"
+            ).execute()
+
+            data = []
+            for row_number, row in enumerate(id_result.get("values", []), start=2):
+                row_id = str(row[0]).strip() if row else ""
+                if row_id in values_by_id:
+                    data.append({
+                        "range": f"{self.sheet_name}!{col_letter}{row_number}",
+                        "values": [[str(values_by_id[row_id])]]
+                    })
+
+            if not data:
+                return 0
+
+            self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"valueInputOption": "RAW", "data": data}
+            ).execute()
+            print(f"Updated {len(data)} cells in column '{target_column}'")
+            return len(data)
+        except Exception as e:
+            print(f"Error in update_column_by_id: {e}")
+            return 0
+
     def col_index_to_letter(self, col_index):
         """Convert column index (1-based) to Excel column letter(s)"""
         result = ""
@@ -0,0 +1,71 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+# Put on the queue by close() to stop the worker thread
+_STOP = object()
+
+
+class MicroBatchEncoder:
+    """
+    Collects single-text encode requests from concurrent callers for up to max_wait_ms,
+    encodes them in one batch and resolves each caller's future with its own embedding.
+    A request that finds nothing else queued is encoded straight away, without waiting.
+    """
+    def __init__(self, encode_function, max_batch_size=32, max_wait_ms=5):
+        self.encode_function = encode_function
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batch-encoder", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def encode(self, text):
+        return self.submit(text).result()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect_batch(self, first_request):
+        batch = [first_request]
+        # Waiting only pays off when other callers are already queued; requests arriving during
+        # this encode are picked up together by the next batch
+        if self._queue.empty():
+            return batch
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is _STOP:
+                # Finish this batch first, then stop
+                self._queue.put(_STOP)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is _STOP:
+                break
+            batch = self._collect_batch(request)
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.encode_function(texts)
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
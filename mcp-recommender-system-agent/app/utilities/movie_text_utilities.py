@@ -0,0 +1,25 @@
+import pandas as pd
+
+# The details a caller knows before rating a movie: no 'User Rating' or 'User Liking (words)'
+MOVIE_DETAIL_COLUMNS = [
+    "Movie Name", "Year", "Timing(min)", "Genre", "Language",
+    "Brief Description", "Cast", "Director", "Screenplay/Writer",
+    "Production Company", "Budget in Rupees", "Revenue in Rupees",
+]
+
+
+# Text the rating models see at prediction time, empty fields are skipped
+def details_to_text(partial_input):
+    return " | ".join(f"{k}: {v}" for k, v in partial_input.items() if v)
+
+
+def movie_details_text(movie_details):
+    """
+    Rating-free text of a movie (a dict or a sheet row): only MOVIE_DETAIL_COLUMNS, in that order.
+    Training rows and prediction requests go through the same text, so both see the same input.
+    """
+    details = {}
+    for column in MOVIE_DETAIL_COLUMNS:
+        value = movie_details.get(column, "")
+        details[column] = str(value).strip() if pd.notnull(value) else ""
+    return details_to_text(details)
@@ -0,0 +1,81 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Custom Modules
+from utilities.movie_text_utilities import MOVIE_DETAIL_COLUMNS
+
+# Normalized details keep the column order the rating models were trained with, other keys follow sorted
+CANONICAL_KEY_ORDER = MOVIE_DETAIL_COLUMNS + ["User Liking (words)"]
+
+
+def normalize_movie_details(movie_details):
+    """
+    Canonical form of a movie-details dict: keys and values stripped, inner whitespace collapsed,
+    empty fields dropped (predict_rating_of_movie skips them too) and keys in CANONICAL_KEY_ORDER.
+    Predict from the normalized details so a cached rating always equals a fresh prediction.
+    """
+    if isinstance(movie_details, str):
+        movie_details = json.loads(movie_details)
+    normalized = {}
+    for key, value in movie_details.items():
+        value = " ".join(str(value).split()) if value is not None else ""
+        if value:
+            normalized[" ".join(str(key).split())] = value
+    known_keys = [key for key in CANONICAL_KEY_ORDER if key in normalized]
+    other_keys = sorted(key for key in normalized if key not in CANONICAL_KEY_ORDER)
+    return {key: normalized[key] for key in known_keys + other_keys}
+
+
+def prediction_cache_key(movie_details, model_fingerprint):
+    canonical = json.dumps(normalize_movie_details(movie_details), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{model_fingerprint}\x00{canonical}".encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """
+    Persistent rating predictions in SQLite, keyed by the normalized movie details and the model fingerprint.
+    The least recently used entries are evicted once max_entries is exceeded.
+    """
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, rating REAL NOT NULL, model_fingerprint TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)")
+
+    def get(self, key):
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT rating FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE predictions SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, rating, model_fingerprint):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO predictions (key, rating, model_fingerprint, last_used) VALUES (?, ?, ?, ?)",
+                (key, float(rating), model_fingerprint, time.time())
+            )
+            (count,) = self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()
+            if count > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM predictions")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
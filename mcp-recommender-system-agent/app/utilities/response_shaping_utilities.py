@@ -0,0 +1,115 @@
+import json
+import math
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+# Rough size of a token for English text, enough to keep tool responses within a prompt budget
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARKER = "..."
+
+
+def estimate_tokens(value):
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def parse_fields(fields, default_fields=None):
+    """Comma separated field names; empty for default_fields, "all" for every field."""
+    if isinstance(fields, (list, tuple)):
+        return list(fields)
+    fields = (fields or "").strip()
+    if not fields:
+        return default_fields
+    if fields.lower() == "all":
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def truncate_text(value, max_chars):
+    value = str(value)
+    if max_chars and len(value) > max_chars:
+        return value[:max(max_chars - len(TRUNCATION_MARKER), 0)] + TRUNCATION_MARKER
+    return value
+
+
+def shape_item(item, fields=None, max_field_chars=200):
+    """Keep only the selected fields of a record (all when fields is None) and truncate long values."""
+    if not isinstance(item, dict):
+        return truncate_text(item, max_field_chars)
+    keys = [key for key in fields if key in item] if fields is not None else list(item.keys())
+    return {
+        key: truncate_text(item[key], max_field_chars) if isinstance(item[key], str) else item[key]
+        for key in keys
+    }
+
+
+def shape_page(items, fields=None, max_field_chars=200, token_budget=1500, page_size=5):
+    """
+    Shape up to page_size items, stopping before the token budget is exceeded.
+    The first item is always included so a page is never empty.
+
+    Returns:
+        tuple: (shaped items, number of source items consumed)
+    """
+    page = []
+    used_tokens = 0
+    for item in items[:max(page_size, 1)]:
+        shaped = shape_item(item, fields, max_field_chars)
+        item_tokens = estimate_tokens(shaped)
+        if page and token_budget and used_tokens + item_tokens > token_budget:
+            break
+        page.append(shaped)
+        used_tokens += item_tokens
+    return page, len(page)
+
+
+class ResultCursorStore:
+    """
+    Keeps full result lists in memory so later pages and full records can be fetched on demand.
+    Cursors look like "<result id>:<offset>"; results expire after ttl_seconds or when max_results is exceeded.
+    """
+    def __init__(self, ttl_seconds=1800, max_results=256):
+        self.ttl_seconds = ttl_seconds
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, items, **options):
+        result_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._results[result_id] = {"items": items, "options": options, "created_at": time.monotonic()}
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result_id
+
+    def get(self, result_id):
+        with self._lock:
+            entry = self._results.get(result_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["created_at"] > self.ttl_seconds:
+                del self._results[result_id]
+                return None
+            self._results.move_to_end(result_id)
+            return entry
+
+    @staticmethod
+    def make_cursor(result_id, offset):
+        return f"{result_id}:{offset}"
+
+    @staticmethod
+    def parse_cursor(cursor):
+        result_id, _, offset = str(cursor).partition(":")
+        return result_id, int(offset or 0)
+
+    def page(self, items, result_id, offset, fields=None, max_field_chars=200, token_budget=1500, page_size=5):
+        """A shaped page starting at offset, with the cursor of the next page (None on the last page)."""
+        page, consumed = shape_page(items[offset:], fields, max_field_chars, token_budget, page_size)
+        next_offset = offset + consumed
+        return {
+            "items": page,
+            "total": len(items),
+            "next_cursor": self.make_cursor(result_id, next_offset) if next_offset < len(items) else None,
+        }
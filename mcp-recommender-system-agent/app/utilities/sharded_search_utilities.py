@@ -0,0 +1,127 @@
+import os
+import sys
+import heapq
+import pickle
+import subprocess
+import threading
+import numpy as np
+
+# Custom Modules
+from utilities.vector_quantization_utilities import normalize_vectors
+
+# Rows scored per matrix multiplication inside a worker, keeps the temporary score buffers small
+SHARD_CHUNK_ROWS = 65536
+# Workers run this module by name from the folder that holds the utilities package
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ShardWorkerError(RuntimeError):
+    """A shard worker died (for example OOM-killed); the instance cannot answer queries any more."""
+
+
+def _search_shard(shard, shard_start, query, top_k):
+    """Partial top-k over one shard, returned as (score, global row index) pairs."""
+    best = []
+    for chunk_start in range(0, len(shard), SHARD_CHUNK_ROWS):
+        scores = np.asarray(shard[chunk_start:chunk_start + SHARD_CHUNK_ROWS]) @ query
+        k = min(top_k, len(scores))
+        indices = np.argpartition(-scores, k - 1)[:k]
+        best.extend(
+            (float(scores[index]), shard_start + chunk_start + int(index))
+            for index in indices
+        )
+    return heapq.nlargest(top_k, best)
+
+
+def _serve_shard(matrix_path, shard_start, shard_end):
+    """
+    Worker loop: memory-map the shard, then answer pickled (query, top_k) requests from stdin
+    with the shard's partial top-k on stdout until stdin is closed.
+    """
+    requests, responses = sys.stdin.buffer, sys.stdout.buffer
+    # Stray prints must not end up in the response stream
+    sys.stdout = sys.stderr
+    shard = np.load(matrix_path, mmap_mode="r")[shard_start:shard_end]
+    while True:
+        try:
+            query, top_k = pickle.load(requests)
+        except EOFError:
+            return
+        pickle.dump(_search_shard(shard, shard_start, query, top_k), responses)
+        responses.flush()
+
+
+class ShardedSimilaritySearch:
+    """
+    Cosine similarity search over an embedding matrix split into contiguous shards.
+    The matrix is written once as a .npy file and memory-mapped by one worker process per shard,
+    so the shards share the OS page cache instead of being copied into each process.
+    A query is scattered to every shard and the partial top-k lists are merged.
+
+    Workers are fresh interpreters running this module, so they load numpy and the shard file only,
+    not the script that created them (multiprocessing's spawn and forkserver would re-run it).
+    """
+    def __init__(self, embeddings, matrix_path, num_workers=None):
+        vectors = normalize_vectors(embeddings)
+        temporary_path = f"{matrix_path}.tmp"
+        with open(temporary_path, "wb") as f:
+            np.save(f, vectors)
+        os.replace(temporary_path, matrix_path)
+
+        self.matrix_path = matrix_path
+        self.num_documents = len(vectors)
+        num_workers = max(1, min(num_workers or os.cpu_count() or 1, self.num_documents))
+        boundaries = np.linspace(0, self.num_documents, num_workers + 1, dtype=int)
+        # One query at a time goes through the pipes
+        self._lock = threading.Lock()
+        self.workers = [
+            subprocess.Popen(
+                [sys.executable, "-m", "utilities.sharded_search_utilities", matrix_path, str(shard_start), str(shard_end)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                cwd=_PACKAGE_ROOT,
+            )
+            for shard_start, shard_end in zip(boundaries[:-1], boundaries[1:])
+        ]
+
+    def __len__(self):
+        return self.num_documents
+
+    def search(self, query_embedding, top_k=5):
+        query = normalize_vectors(query_embedding).reshape(-1)
+        top_k = min(top_k, self.num_documents)
+        with self._lock:
+            try:
+                for worker in self.workers:
+                    pickle.dump((query, top_k), worker.stdin)
+                    worker.stdin.flush()
+                partial_results = [pickle.load(worker.stdout) for worker in self.workers]
+            except (EOFError, OSError, pickle.UnpicklingError) as error:
+                raise ShardWorkerError(f"A similarity search worker exited unexpectedly: {error!r}") from error
+        merged = heapq.nlargest(top_k, (pair for partial in partial_results for pair in partial))
+        indices = np.array([index for _, index in merged], dtype=np.int64)
+        scores = np.array([score for score, _ in merged], dtype=np.float32)
+        return indices, scores
+
+    def close(self, timeout_seconds=5):
+        with self._lock:
+            # Closing stdin ends each worker's request loop
+            for worker in self.workers:
+                try:
+                    worker.stdin.close()
+                except OSError:
+                    pass
+            for worker in self.workers:
+                try:
+                    worker.wait(timeout=timeout_seconds)
+                except subprocess.TimeoutExpired:
+                    worker.kill()
+                    worker.wait()
+                worker.stdout.close()
+            self.workers = []
+            if os.path.exists(self.matrix_path):
+                os.remove(self.matrix_path)
+
+
+if __name__ == "__main__":
+    _serve_shard(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
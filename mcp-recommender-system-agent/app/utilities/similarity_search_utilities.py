@@ -1,40 +1,177 @@
-import requests
 from sentence_transformers import SentenceTransformer, util
 import torch
+import numpy as np
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
 import traceback
 
+# Custom Modules
+from utilities.embedding_registry_utilities import get_active_embedding_model, get_embedding_model_spec
+from utilities.vector_quantization_utilities import QuantizedVectorIndex, recall_at_k
+from utilities.sharded_search_utilities import ShardedSimilaritySearch, ShardWorkerError
+from utilities.micro_batching_utilities import MicroBatchEncoder
+
 class SimilaritySearchUtilities:
-    _model = None  # class-level shared model
-    def __init__(self, model_name="all-mpnet-base-v2"):
-        if SimilaritySearchUtilities._model is None:
-            SimilaritySearchUtilities._model = SentenceTransformer(model_name)
-        self.model = SimilaritySearchUtilities._model
-
-    def _load_model_from_sentence_transformer(self, model = "all-mpnet-base-v2"):
-        model = SentenceTransformer(model)
+    _models = {}  # class-level shared models, keyed by registry name
+    _batch_encoders = {}  # class-level micro-batching queues in front of the shared models
+    _batch_encoders_lock = threading.Lock()
+    def __init__(self, model_name=None, float_store_folder=None, micro_batching=True, max_batch_size=32, max_wait_ms=5):
+        self.model_name = model_name or get_active_embedding_model()
+        self.model_spec = get_embedding_model_spec(self.model_name)
+        if self.model_name not in SimilaritySearchUtilities._models:
+            SimilaritySearchUtilities._models[self.model_name] = self._load_model_from_sentence_transformer(
+                self.model_spec["path"], truncate_dim=self.model_spec["truncate_dim"]
+            )
+        self.model = SimilaritySearchUtilities._models[self.model_name]
+        self.batch_encoder = self._get_batch_encoder(max_batch_size, max_wait_ms) if micro_batching else None
+        # Folder where the quantized index keeps its memory-mapped float vectors for re-ranking
+        self.float_store_folder = float_store_folder or tempfile.gettempdir()
+        # quantization method -> (index key, index), so checking one method does not evict the one serving search
+        self._quantized_indexes = {}
+        self._sharded_search = None
+        self._sharded_search_key = None
+        # Tool calls from concurrent sessions share this instance and its cached indexes
+        self._index_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _load_model_from_sentence_transformer(self, model = "all-mpnet-base-v2", truncate_dim=None):
+        model = SentenceTransformer(model, truncate_dim=truncate_dim)
         return model
 
+    def _get_batch_encoder(self, max_batch_size, max_wait_ms):
+        with SimilaritySearchUtilities._batch_encoders_lock:
+            if self.model_name not in SimilaritySearchUtilities._batch_encoders:
+                SimilaritySearchUtilities._batch_encoders[self.model_name] = MicroBatchEncoder(
+                    self.model.encode, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+                )
+            return SimilaritySearchUtilities._batch_encoders[self.model_name]
+
     def generate_embedding(self, text):
+        # Single texts from concurrent callers are encoded together; lists are already a batch
+        if self.batch_encoder is not None and isinstance(text, str):
+            return self.batch_encoder.encode(text)
         embedding = self.model.encode(text)
         return embedding
     
-    def get_top_k_results(self, user_query, list_of_document_embeddings, list_of_documents, top_k=5):
+    def _embeddings_matrix(self, list_of_document_embeddings):
+        """
+        The catalog vectors as a float32 matrix. Accepts the vectors or a function returning them,
+        so callers can skip parsing the catalog when a cached index is still valid.
+        """
+        if callable(list_of_document_embeddings):
+            list_of_document_embeddings = list_of_document_embeddings()
+        embeddings = np.asarray(list_of_document_embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.model_spec["dimension"]:
+            raise ValueError(f"Document embeddings have shape {embeddings.shape}, but '{self.model_name}' produces {self.model_spec['dimension']} dimensions")
+        return embeddings
+
+    def _catalog_key(self, list_of_document_embeddings, catalog_version):
+        # Hashing every vector is only a fallback for callers that cannot give a catalog version
+        if catalog_version is not None:
+            return catalog_version
+        return hashlib.sha1(self._embeddings_matrix(list_of_document_embeddings).tobytes()).hexdigest()
+
+    def get_quantized_index(self, list_of_document_embeddings, quantization="int8", rerank_candidates=50, catalog_version=None):
+        """
+        Build the compressed index for the catalog, reusing the previous one while the catalog version is unchanged.
+        """
+        index_key = (rerank_candidates, self._catalog_key(list_of_document_embeddings, catalog_version))
+        cached = self._quantized_indexes.get(quantization)
+        if cached is None or cached[0] != index_key:
+            index = QuantizedVectorIndex(
+                self._embeddings_matrix(list_of_document_embeddings), method=quantization,
+                rerank_candidates=rerank_candidates, float_store_path=self._float_store_path(quantization)
+            )
+            cached = (index_key, index)
+            self._quantized_indexes[quantization] = cached
+        return cached[1]
+
+    def _float_store_path(self, quantization):
+        return os.path.join(self.float_store_folder, f"catalog-floats-{self.model_name}-{quantization}-{os.getpid()}.npy")
+
+    def get_sharded_search(self, list_of_document_embeddings, num_workers, catalog_version=None):
+        """
+        Start the shard workers for the catalog, reusing them while the catalog version and worker count are unchanged.
+        """
+        search_key = (num_workers, self._catalog_key(list_of_document_embeddings, catalog_version))
+        if self._sharded_search_key != search_key:
+            self.close_sharded_search()
+            matrix_path = os.path.join(tempfile.gettempdir(), f"catalog-embeddings-{self.model_name}-{os.getpid()}.npy")
+            self._sharded_search = ShardedSimilaritySearch(
+                self._embeddings_matrix(list_of_document_embeddings), matrix_path, num_workers=num_workers
+            )
+            self._sharded_search_key = search_key
+        return self._sharded_search
+
+    def close_sharded_search(self):
+        # Callers hold _index_lock
+        if self._sharded_search is not None:
+            self._sharded_search.close()
+        self._sharded_search = None
+        self._sharded_search_key = None
+
+    def close(self):
+        with self._index_lock:
+            self.close_sharded_search()
+            for quantization in self._quantized_indexes:
+                if os.path.exists(self._float_store_path(quantization)):
+                    os.remove(self._float_store_path(quantization))
+            self._quantized_indexes = {}
+
+    def check_recall(self, list_of_document_embeddings, quantization="int8", top_k=10, rerank_candidates=50, num_queries=100, catalog_version=None):
+        """Recall@k of the compressed index against exact float search, using perturbed catalog vectors as queries."""
+        embeddings = self._embeddings_matrix(list_of_document_embeddings)
+        with self._index_lock:
+            index = self.get_quantized_index(embeddings, quantization, rerank_candidates, catalog_version)
+        return {
+            "quantization": quantization,
+            "top_k": top_k,
+            "recall": round(recall_at_k(index, embeddings, top_k=top_k, num_queries=num_queries), 4),
+            "compression_ratio": round(index.compression_ratio, 1),
+        }
+
+    def get_top_k_results(self, user_query, list_of_document_embeddings, list_of_documents, top_k=5, quantization=None, rerank_candidates=50, num_workers=0, min_documents_for_sharding=100000, catalog_version=None):
+        """
+        list_of_document_embeddings may be a function returning the vectors; with a catalog_version
+        (see embedding_catalog_version) the compressed and sharded indexes are reused without calling it.
+        """
         try:
             top_k_documents = []
             top_k_scores = []
-            embeddings_tensor = list_of_document_embeddings
+            top_k = min(top_k, len(list_of_documents))
 
+            # A single text goes through the micro-batching queue together with concurrent callers
+            query_embedding = self.generate_embedding(user_query)
 
-            # FIX: Wrap user_query in a list and get the first result
-            query_embedding = self.generate_embedding([user_query])[0]
+            top_indices = None
+            if quantization:
+                with self._index_lock:
+                    index = self.get_quantized_index(list_of_document_embeddings, quantization, rerank_candidates, catalog_version)
+                top_indices, top_values = index.search(query_embedding, top_k=top_k)
+            elif num_workers > 1 and len(list_of_documents) >= min_documents_for_sharding:
+                # Held during the search too, so another session cannot shut the workers down mid-query
+                with self._index_lock:
+                    sharded_search = self.get_sharded_search(list_of_document_embeddings, num_workers, catalog_version)
+                    try:
+                        top_indices, top_values = sharded_search.search(query_embedding, top_k=top_k)
+                    except ShardWorkerError as error:
+                        # Drop the broken workers so the next query starts new ones; this one is answered in process
+                        print(error)
+                        self.close_sharded_search()
 
-            cosine_scores = util.cos_sim(query_embedding, embeddings_tensor)[0]
-            top_results = torch.topk(cosine_scores, k=top_k)
+            if top_indices is None:
+                embeddings_tensor = torch.from_numpy(self._embeddings_matrix(list_of_document_embeddings))
+                cosine_scores = util.cos_sim(query_embedding, embeddings_tensor)[0]
+                top_results = torch.topk(cosine_scores, k=top_k)
+                top_indices, top_values = top_results.indices.tolist(), top_results.values.tolist()
 
-            for score, idx in zip(top_results.values, top_results.indices):
+            for score, idx in zip(top_values, top_indices):
                 print(f"{list_of_documents[idx]} (score: {score:.4f})")
                 top_k_documents.append(list_of_documents[idx])
-                top_k_scores.append(round(score.item(), 4))
+                top_k_scores.append(round(float(score), 4))
 
             return {
                 "top_k_documents": top_k_documents,
@@ -44,4 +181,3 @@ class SimilaritySearchUtilities:
             print(error)
             print(traceback.print_exc())
     
-
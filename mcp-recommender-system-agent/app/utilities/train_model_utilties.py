@@ -4,10 +4,19 @@ os.environ['WANDB_DISABLED'] = 'true'
 from transformers import BertForSequenceClassification, Trainer, TrainingArguments
 from transformers import BertTokenizer
 import torch
+import json
 import pandas as pd
 
 # Custom Modules
 from Config import TRAINING_MODEL_RESULTS_FOLDER, TRAINING_MODEL_LOGS_FOLDER
+from utilities.embedding_rating_model_utilities import predict_rating_with_embedding_model, EMBEDDING_RATING_MODEL_FILE
+from utilities.movie_text_utilities import details_to_text
+
+# The distilled student is saved next to the teacher checkpoint
+STUDENT_MODEL_FOLDER = os.path.join(TRAINING_MODEL_RESULTS_FOLDER, "student")
+DISTILLATION_REPORT_FILE = "distillation_report.json"
+# The files that decide a checkpoint's predictions; pytorch_model.bin for checkpoints saved without safetensors
+CHECKPOINT_FILES = ["model.safetensors", "pytorch_model.bin", "config.json"]
 
 class RatingsDataset(torch.utils.data.Dataset):
     def __init__(self, encodings, labels):
@@ -42,11 +51,12 @@ def row_to_text(row):
 def incremental_learning_the_model():
     pass
 
-def train_movie_rating_model(data):
-    df = data
-    df["input_text"] = df.apply(row_to_text, axis=1)
-    df["label"] = df["User Rating"].astype(float)
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+def build_ratings_dataset(df, tokenizer):
+    # Snapshots already carry input_text and label; raw sheet rows are converted here
+    if "input_text" not in df.columns:
+        df["input_text"] = df.apply(row_to_text, axis=1)
+    if "label" not in df.columns:
+        df["label"] = df["User Rating"].astype(float)
     # Tokenize the dataset
     encodings = tokenizer(
         list(df["input_text"]),
@@ -54,7 +64,23 @@ def train_movie_rating_model(data):
         padding=True,
         max_length=512
     )
-    dataset = RatingsDataset(encodings, df["label"].tolist())
+    return RatingsDataset(encodings, df["label"].astype(float).tolist())
+
+def compute_regression_metrics(eval_prediction):
+    predictions = eval_prediction.predictions.reshape(-1)
+    labels = eval_prediction.label_ids.reshape(-1)
+    errors = predictions - labels
+    return {
+        "mae": float(abs(errors).mean()),
+        "rmse": float((errors ** 2).mean() ** 0.5),
+    }
+
+def train_movie_rating_model(data, validation_data=None):
+    df = data
+    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+    dataset = build_ratings_dataset(df, tokenizer)
+    has_validation = validation_data is not None and len(validation_data) > 0
+    validation_dataset = build_ratings_dataset(validation_data, tokenizer) if has_validation else None
 
     model = BertForSequenceClassification.from_pretrained(
         "bert-base-uncased",
@@ -70,37 +96,125 @@ def train_movie_rating_model(data):
         weight_decay=0.01,
         logging_dir=TRAINING_MODEL_LOGS_FOLDER,
         logging_steps=10,
-        save_strategy="no"
+        save_strategy="no",
+        eval_strategy="epoch" if has_validation else "no",
+        seed=42
     )
 
     trainer = Trainer(
         model=model,
         args=training_args,
-        train_dataset=dataset
+        train_dataset=dataset,
+        eval_dataset=validation_dataset,
+        compute_metrics=compute_regression_metrics
     )
 
     trainer.train()
 
     trainer.save_model(TRAINING_MODEL_RESULTS_FOLDER)
     tokenizer.save_pretrained(TRAINING_MODEL_RESULTS_FOLDER)
+    return trainer.evaluate() if has_validation else {}
 
-def predict_rating_of_movie(partial_input):
-    # Load model and tokenizer
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
-    model = BertForSequenceClassification.from_pretrained(
-        TRAINING_MODEL_RESULTS_FOLDER,  # or wherever you saved it
-        num_labels=1,
-        problem_type="regression"
-    )
-    model.eval()
+# model folder -> (checkpoint fingerprint, tokenizer, model)
+_loaded_rating_models = {}
+# report path -> (modification time, distillation report)
+_distillation_reports = {}
 
+def _file_fingerprint(model_folder, file_names):
+    parts = []
+    for file_name in file_names:
+        try:
+            stat = os.stat(os.path.join(model_folder, file_name))
+        except FileNotFoundError:
+            continue
+        parts.append(f"{file_name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+def checkpoint_fingerprint(model_folder):
+    """
+    Changes whenever the BERT checkpoint's weights or config are rewritten. Other files in the folder,
+    such as the embedding rating model or the student's subfolder, do not affect it.
+    """
+    return _file_fingerprint(model_folder, CHECKPOINT_FILES)
+
+def load_rating_model(model_folder=TRAINING_MODEL_RESULTS_FOLDER):
+    # Load model and tokenizer once, and again only after the checkpoint changes
+    fingerprint = checkpoint_fingerprint(model_folder)
+    cached = _loaded_rating_models.get(model_folder)
+    if cached is None or cached[0] != fingerprint:
+        # Checkpoints saved with their tokenizer carry their own max length (shorter for the student)
+        has_tokenizer = os.path.exists(os.path.join(model_folder, "vocab.txt"))
+        tokenizer = BertTokenizer.from_pretrained(model_folder if has_tokenizer else "bert-base-uncased")
+        model = BertForSequenceClassification.from_pretrained(
+            model_folder,  # or wherever you saved it
+            num_labels=1,
+            problem_type="regression"
+        )
+        model.eval()
+        cached = (fingerprint, tokenizer, model)
+        _loaded_rating_models[model_folder] = cached
+    return cached[1], cached[2]
+
+def read_distillation_report(student_folder=STUDENT_MODEL_FOLDER):
+    # Read again only after the report is rewritten, it is consulted on every prediction
+    report_path = os.path.join(student_folder, DISTILLATION_REPORT_FILE)
+    try:
+        modified_time = os.stat(report_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _distillation_reports.get(report_path)
+    if cached is None or cached[0] != modified_time:
+        with open(report_path, "r") as f:
+            cached = (modified_time, json.load(f))
+        _distillation_reports[report_path] = cached
+    return cached[1]
+
+def default_rating_backend():
+    """
+    RATING_MODEL_BACKEND when set, otherwise the distilled student if it was distilled from the current teacher.
+    """
+    if os.environ.get("RATING_MODEL_BACKEND"):
+        return os.environ["RATING_MODEL_BACKEND"]
+    report = read_distillation_report()
+    if report and report.get("teacher_fingerprint") == checkpoint_fingerprint(TRAINING_MODEL_RESULTS_FOLDER):
+        return "student"
+    return "bert"
+
+def rating_model_fingerprint(backend=None):
+    """Identifies the checkpoint a backend would predict with; changes whenever that checkpoint is rewritten."""
+    backend = backend or default_rating_backend()
+    if backend == "embedding":
+        return f"{backend}:{_file_fingerprint(TRAINING_MODEL_RESULTS_FOLDER, [EMBEDDING_RATING_MODEL_FILE])}"
+    model_folder = STUDENT_MODEL_FOLDER if backend == "student" else TRAINING_MODEL_RESULTS_FOLDER
+    return f"{backend}:{checkpoint_fingerprint(model_folder)}"
+
+def predict_rating_of_movie(partial_input, backend=None, embedding=None):
+    """
+    Predict the user's rating for a movie.
+
+    Args:
+        partial_input (dict): The details of the movie, empty fields are skipped.
+        backend (str): "student" for the distilled model, "bert" for the fine-tuned teacher
+            or "embedding" for the model over catalog embeddings. Defaults to default_rating_backend().
+        embedding (list): Embedding of movie_details_text(partial_input), required by the "embedding" backend.
+    """
+    backend = backend or default_rating_backend()
+    if backend == "embedding":
+        if embedding is None:
+            raise ValueError("The embedding backend needs the embedding of the movie details")
+        predicted_rating = predict_rating_with_embedding_model(partial_input, embedding, TRAINING_MODEL_RESULTS_FOLDER)
+        print(f"Predicted Rating: {predicted_rating:.2f}")
+        return predicted_rating
+    if backend not in ("bert", "student"):
+        raise ValueError(f"Unknown rating model backend '{backend}'")
+
+    tokenizer, model = load_rating_model(STUDENT_MODEL_FOLDER if backend == "student" else TRAINING_MODEL_RESULTS_FOLDER)
 
     # Format partial input into text
-    text = " | ".join(f"{k}: {v}" for k, v in partial_input.items() if v)
-    tokenizer = BertTokenizer.from_pretrained("bert-base-uncased")
+    text = details_to_text(partial_input)
     
     # Tokenize
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=min(512, tokenizer.model_max_length))
     
     # Predict
     with torch.no_grad():
@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Custom Modules
+from utilities.train_model_utilties import row_to_text
+from utilities.movie_text_utilities import MOVIE_DETAIL_COLUMNS
+
+LATEST_SNAPSHOT_FILE = "LATEST"
+# Bumped when snapshot columns change, so unchanged sheet data is exported again in the new layout
+SNAPSHOT_FORMAT = 2
+
+
+def _snapshot_path(snapshot_folder, version):
+    return os.path.join(snapshot_folder, f"snapshot-{version}.parquet")
+
+
+def _manifest_path(snapshot_folder, version):
+    return os.path.join(snapshot_folder, f"snapshot-{version}.json")
+
+
+def _content_hash(snapshot):
+    digest = hashlib.sha256(f"format:{SNAPSHOT_FORMAT}\x1e".encode("utf-8"))
+    for row in snapshot.sort_values("ID").itertuples(index=False):
+        digest.update(f"{row.ID}\x1f{row.input_text}\x1f{row.label!r}\x1e".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def list_training_snapshots(snapshot_folder):
+    """Manifests of the stored snapshots, oldest first."""
+    if not os.path.isdir(snapshot_folder):
+        return []
+    manifests = []
+    for file_name in sorted(os.listdir(snapshot_folder)):
+        if file_name.startswith("snapshot-") and file_name.endswith(".json"):
+            with open(os.path.join(snapshot_folder, file_name), "r") as f:
+                manifests.append(json.load(f))
+    return sorted(manifests, key=lambda manifest: manifest["created_at"])
+
+
+def get_latest_snapshot_version(snapshot_folder):
+    latest_path = os.path.join(snapshot_folder, LATEST_SNAPSHOT_FILE)
+    if not os.path.exists(latest_path):
+        return None
+    with open(latest_path, "r") as f:
+        return f.read().strip() or None
+
+
+def export_training_snapshot(data, snapshot_folder):
+    """
+    Write the training rows of a sheet DataFrame to a versioned Parquet file with the BERT input text, the label
+    and the raw MOVIE_DETAIL_COLUMNS (for the embedding rating model and distillation). Rows without a numeric 'User Rating' are left out. Exporting unchanged data reuses the existing snapshot.
+
+    Returns:
+        dict: The manifest of the snapshot
+    """
+    os.makedirs(snapshot_folder, exist_ok=True)
+    df = data.copy()
+    df["label"] = pd.to_numeric(df["User Rating"], errors="coerce")
+    df = df[df["label"].notnull()]
+
+    snapshot = pd.DataFrame({
+        "ID": df["ID"].astype(str),
+        "input_text": df.apply(row_to_text, axis=1) if not df.empty else pd.Series(dtype=str),
+        "label": df["label"].astype("float32"),
+    })
+    for column in MOVIE_DETAIL_COLUMNS:
+        values = df[column] if column in df.columns else pd.Series("", index=df.index)
+        snapshot[column] = values.where(values.notnull(), "").astype(str)
+    snapshot = snapshot.reset_index(drop=True)
+
+    content_hash = _content_hash(snapshot)
+    for manifest in list_training_snapshots(snapshot_folder):
+        if manifest["content_hash"] == content_hash:
+            print(f"Training data unchanged, reusing snapshot {manifest['version']}")
+            _write_latest(snapshot_folder, manifest["version"])
+            return manifest
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{content_hash[:12]}"
+    parquet_path = _snapshot_path(snapshot_folder, version)
+    temporary_path = f"{parquet_path}.tmp"
+    pq.write_table(pa.Table.from_pandas(snapshot, preserve_index=False), temporary_path)
+    os.replace(temporary_path, parquet_path)
+
+    manifest = {
+        "version": version,
+        "rows": len(snapshot),
+        "content_hash": content_hash,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "columns": list(snapshot.columns),
+    }
+    with open(_manifest_path(snapshot_folder, version), "w") as f:
+        json.dump(manifest, f, indent=2)
+    _write_latest(snapshot_folder, version)
+    return manifest
+
+
+def _write_latest(snapshot_folder, version):
+    with open(os.path.join(snapshot_folder, LATEST_SNAPSHOT_FILE), "w") as f:
+        f.write(version)
+
+
+def load_training_snapshot(snapshot_folder, version=None, memory_map=True):
+    """Read a snapshot (the latest when version is None) with the Parquet file memory-mapped."""
+    version = version or get_latest_snapshot_version(snapshot_folder)
+    if version is None:
+        raise FileNotFoundError(f"No training snapshot found in {snapshot_folder}")
+    table = pq.read_table(_snapshot_path(snapshot_folder, version), memory_map=memory_map)
+    return table.to_pandas()
+
+
+def split_train_validation(data, validation_fraction=0.1, seed=42):
+    """
+    Deterministic split by hashing each row ID with the seed, so a row stays on the same side
+    across runs and snapshots regardless of row order.
+    """
+    def bucket(row_id):
+        digest = hashlib.sha256(f"{seed}:{row_id}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+    is_validation = data["ID"].astype(str).map(bucket) < validation_fraction
+    return data[~is_validation].reset_index(drop=True), data[is_validation].reset_index(drop=True)
@@ -0,0 +1,85 @@
+import time
+import functools
+import threading
+import anyio
+
+TRANSPORTS = ("stdio", "sse", "streamable-http")
+
+# Tool calls currently running or waiting for a worker thread, across all bounded tools
+_in_flight_lock = threading.Lock()
+_in_flight_calls = 0
+
+
+def bounded_tool(max_concurrency=4, max_pending=16):
+    """
+    Run a blocking tool in a worker thread so one slow call does not stall every other session,
+    with at most max_concurrency calls running and max_pending waiting. Calls beyond that are
+    rejected straight away with a busy message instead of queueing without bound.
+    Place it below @mcp.tool(); the tool keeps its name, docstring and arguments.
+    """
+    def decorator(function):
+        state = {"limiter": None, "pending": 0}
+        state_lock = threading.Lock()
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            global _in_flight_calls
+            with state_lock:
+                if state["pending"] >= max_concurrency + max_pending:
+                    return f"Server busy: too many concurrent '{function.__name__}' calls. Please retry shortly."
+                state["pending"] += 1
+                # The limiter has to be created inside the running event loop
+                if state["limiter"] is None:
+                    state["limiter"] = anyio.CapacityLimiter(max_concurrency)
+            with _in_flight_lock:
+                _in_flight_calls += 1
+            try:
+                return await anyio.to_thread.run_sync(
+                    functools.partial(function, *args, **kwargs), limiter=state["limiter"]
+                )
+            finally:
+                with state_lock:
+                    state["pending"] -= 1
+                with _in_flight_lock:
+                    _in_flight_calls -= 1
+        return wrapper
+    return decorator
+
+
+def wait_for_in_flight_tools(timeout_seconds=30):
+    """Wait for running tool calls to finish. Returns True when none are left."""
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        with _in_flight_lock:
+            if _in_flight_calls == 0:
+                return True
+        time.sleep(0.1)
+    return False
+
+
+def run_http_server(mcp, transport="streamable-http", graceful_shutdown_seconds=30):
+    """
+    Serve the MCP server over the network on mcp.settings.host and mcp.settings.port.
+    On SIGINT/SIGTERM new connections are refused, open sessions get graceful_shutdown_seconds to finish,
+    and tool calls still running in worker threads are waited for before returning.
+    """
+    import uvicorn
+
+    if transport == "streamable-http":
+        app = mcp.streamable_http_app()
+    elif transport == "sse":
+        app = mcp.sse_app()
+    else:
+        raise ValueError(f"Unknown network transport '{transport}'. Use 'sse' or 'streamable-http'.")
+
+    config = uvicorn.Config(
+        app,
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        log_level=mcp.settings.log_level.lower(),
+        timeout_graceful_shutdown=graceful_shutdown_seconds,
+    )
+    uvicorn.Server(config).run()
+
+    if not wait_for_in_flight_tools(graceful_shutdown_seconds):
+        print("Shutting down with tool calls still running")
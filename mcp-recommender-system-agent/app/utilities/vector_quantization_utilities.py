@@ -0,0 +1,228 @@
+import os
+import numpy as np
+
+QUANTIZATION_METHODS = ("int8", "pq")
+
+
+def normalize_vectors(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors, num_centroids, num_iterations, random_state):
+    """Plain Lloyd's k-means, enough to train product quantization codebooks."""
+    # Sub-vectors are strided column slices; a contiguous copy keeps the matrix products fast
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    centroids = vectors[random_state.choice(len(vectors), num_centroids, replace=False)].copy()
+    previous_assignments = None
+    for _ in range(num_iterations):
+        # |v|^2 is the same for every centroid, so it is left out of the argmin
+        distances = vectors @ (-2 * centroids.T)
+        distances += (centroids ** 2).sum(axis=1)
+        assignments = distances.argmin(axis=1)
+        if previous_assignments is not None and np.array_equal(assignments, previous_assignments):
+            break
+        previous_assignments = assignments
+        counts = np.bincount(assignments, minlength=num_centroids)
+        sums = np.stack([
+            np.bincount(assignments, weights=vectors[:, dimension], minlength=num_centroids)
+            for dimension in range(vectors.shape[1])
+        ], axis=1)
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class ScalarQuantizer:
+    """
+    Stores each dimension as an int8 code using a per-dimension offset and scale (4x smaller than float32).
+    Queries stay in float32 and are scored against the codes directly (asymmetric distance).
+    """
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+        self.offset = None
+        self.scale = None
+
+    def fit(self, vectors):
+        minimum = vectors.min(axis=0)
+        maximum = vectors.max(axis=0)
+        self.offset = minimum
+        self.scale = np.maximum((maximum - minimum) / 255.0, 1e-12).astype(np.float32)
+        return self
+
+    def encode(self, vectors):
+        codes = np.rint((vectors - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes):
+        return (codes.astype(np.float32) + 128) * self.scale + self.offset
+
+    def score(self, query, codes):
+        # query . decode(code) = (query * scale) . code + query . (128 * scale + offset)
+        scaled_query = query * self.scale
+        bias = float(query @ (128 * self.scale + self.offset))
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.chunk_size):
+            chunk = codes[start:start + self.chunk_size].astype(np.float32)
+            scores[start:start + self.chunk_size] = chunk @ scaled_query + bias
+        return scores
+
+
+class ProductQuantizer:
+    """
+    Splits each vector into sub-vectors and stores the index of the nearest codebook centroid for each one,
+    one byte per sub-vector. Queries are scored with per-subspace lookup tables (asymmetric distance).
+    """
+    def __init__(self, num_subvectors=None, num_centroids=256, num_iterations=20, training_vectors_per_centroid=40,
+                 chunk_size=65536, seed=42):
+        self.num_subvectors = num_subvectors
+        self.num_centroids = num_centroids
+        self.num_iterations = num_iterations
+        # Codebooks are trained on a random sample of at most this many vectors per centroid, then every vector is encoded
+        self.training_vectors_per_centroid = training_vectors_per_centroid
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.codebooks = None
+
+    @staticmethod
+    def default_num_subvectors(dimension):
+        # Aim for 8 dimensions per sub-vector, e.g. 768 -> 96 bytes per vector (32x smaller than float32)
+        for num_subvectors in range(max(dimension // 8, 1), 0, -1):
+            if dimension % num_subvectors == 0:
+                return num_subvectors
+        return 1
+
+    def fit(self, vectors):
+        dimension = vectors.shape[1]
+        if self.num_subvectors is None:
+            self.num_subvectors = self.default_num_subvectors(dimension)
+        if dimension % self.num_subvectors != 0:
+            raise ValueError(f"Dimension {dimension} is not divisible by num_subvectors={self.num_subvectors}")
+        self.subvector_dimension = dimension // self.num_subvectors
+        num_centroids = min(self.num_centroids, len(vectors))
+        random_state = np.random.RandomState(self.seed)
+        max_training_vectors = self.training_vectors_per_centroid * self.num_centroids
+        if len(vectors) > max_training_vectors:
+            sample = np.sort(random_state.choice(len(vectors), max_training_vectors, replace=False))
+            vectors = np.asarray(vectors[sample])
+
+        self.codebooks = np.stack([
+            _kmeans(self._subvectors(vectors, index), num_centroids, self.num_iterations, random_state)
+            for index in range(self.num_subvectors)
+        ])
+        return self
+
+    def _subvectors(self, vectors, index):
+        start = index * self.subvector_dimension
+        return vectors[:, start:start + self.subvector_dimension]
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), self.num_subvectors), dtype=np.uint8)
+        for start in range(0, len(vectors), self.chunk_size):
+            chunk = vectors[start:start + self.chunk_size]
+            for index, codebook in enumerate(self.codebooks):
+                subvectors = np.ascontiguousarray(self._subvectors(chunk, index), dtype=np.float32)
+                distances = (codebook ** 2).sum(axis=1) - 2 * subvectors @ codebook.T
+                codes[start:start + self.chunk_size, index] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes):
+        return np.concatenate([
+            codebook[codes[:, index]] for index, codebook in enumerate(self.codebooks)
+        ], axis=1)
+
+    def score(self, query, codes):
+        query_subvectors = query.reshape(self.num_subvectors, self.subvector_dimension)
+        # lookup_tables[i, c] = query sub-vector i . centroid c of codebook i
+        lookup_tables = np.einsum("md,mcd->mc", query_subvectors, self.codebooks)
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for index in range(self.num_subvectors):
+            scores += lookup_tables[index, codes[:, index]]
+        return scores
+
+
+class QuantizedVectorIndex:
+    """
+    Cosine similarity index over compressed vectors.
+    Candidates are found with the compressed codes and the best ones are re-ranked with the exact float vectors.
+    Pass float_store_path to keep the float vectors memory-mapped on disk instead of in memory.
+    """
+    def __init__(self, embeddings, method="int8", rerank_candidates=50, num_subvectors=None, float_store_path=None):
+        if method not in QUANTIZATION_METHODS:
+            raise ValueError(f"Unknown quantization method '{method}'. Supported methods: {QUANTIZATION_METHODS}")
+        vectors = normalize_vectors(embeddings)
+        self.method = method
+        self.rerank_candidates = rerank_candidates
+        self.quantizer = ScalarQuantizer() if method == "int8" else ProductQuantizer(num_subvectors=num_subvectors)
+        self.quantizer.fit(vectors)
+        self.codes = self.quantizer.encode(vectors)
+
+        if float_store_path:
+            # Write next to the old file and swap, so an index still reading the old file is not truncated under it
+            temporary_path = f"{float_store_path}.tmp"
+            with open(temporary_path, "wb") as f:
+                np.save(f, vectors)
+            os.replace(temporary_path, float_store_path)
+            self.vectors = np.load(float_store_path, mmap_mode="r")
+        else:
+            self.vectors = vectors
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def compression_ratio(self):
+        return (self.vectors.shape[1] * 4) / self.codes[0].nbytes
+
+    def search(self, query_embedding, top_k=5):
+        query = normalize_vectors(query_embedding).reshape(-1)
+        top_k = min(top_k, len(self))
+        num_candidates = min(max(self.rerank_candidates, top_k), len(self))
+
+        approximate_scores = self.quantizer.score(query, self.codes)
+        candidates = np.argpartition(-approximate_scores, num_candidates - 1)[:num_candidates]
+        # Exact re-rank of the candidates with the float vectors
+        candidates = np.sort(candidates)
+        exact_scores = np.asarray(self.vectors[candidates]) @ query
+        order = np.argsort(-exact_scores)[:top_k]
+        return candidates[order], exact_scores[order]
+
+
+def exact_top_k(embeddings, query_embedding, top_k=5):
+    vectors = normalize_vectors(embeddings)
+    scores = vectors @ normalize_vectors(query_embedding).reshape(-1)
+    top_k = min(top_k, len(scores))
+    indices = np.argpartition(-scores, top_k - 1)[:top_k]
+    indices = indices[np.argsort(-scores[indices])]
+    return indices, scores[indices]
+
+
+def perturbed_queries(embeddings, num_queries=100, noise_scale=0.5, seed=42):
+    """
+    Queries near, but not equal to, sampled catalog vectors. A catalog vector used as its own query is
+    always its exact nearest neighbour, which makes recall look better than it is for unseen queries.
+    """
+    embeddings = normalize_vectors(embeddings)
+    random_state = np.random.RandomState(seed)
+    sample = random_state.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+    noise = normalize_vectors(random_state.standard_normal((len(sample), embeddings.shape[1])))
+    return normalize_vectors(embeddings[sample] + noise_scale * noise)
+
+
+def recall_at_k(index, embeddings, query_embeddings=None, top_k=10, num_queries=100, seed=42):
+    """
+    Fraction of the exact top-k neighbours that the quantized index also returns, averaged over the queries.
+    Uses perturbed_queries when none are given.
+    """
+    embeddings = normalize_vectors(embeddings)
+    if query_embeddings is None:
+        query_embeddings = perturbed_queries(embeddings, num_queries, seed=seed)
+
+    recalls = []
+    for query in np.atleast_2d(query_embeddings):
+        expected, _ = exact_top_k(embeddings, query, top_k)
+        found, _ = index.search(query, top_k)
+        recalls.append(len(set(expected.tolist()) & set(found.tolist())) / len(expected))
+    return float(np.mean(recalls))
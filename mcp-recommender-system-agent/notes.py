@@ -1,17 +1,194 @@
 # server.py
 from mcp.server.fastmcp import FastMCP
 import os
+import re
+import json
+import time
+import threading
+from array import array
 
 # Create an MCP server
 mcp = FastMCP("AI Sticky Notes")
 
 # Having notes in my current directory
 NOTES_FILE = os.path.join(os.path.dirname(__file__), "notes.txt")
+# Byte offset where each note starts, so any note or range is one seek away
+NOTES_INDEX_FILE = NOTES_FILE + ".idx"
+# The index starts with the notes file's size and mtime, so a hand-edited notes file is re-indexed
+NOTES_INDEX_HEADER_LENGTH = 2
+# ID of the last note already handed out for summarization
+NOTES_SUMMARY_FILE = NOTES_FILE + ".summary.json"
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class NotesStore:
+    """
+    Append-only notes log with one note per line. New notes are JSON lines with an ID and timestamp;
+    plain-text lines written before the store existed are read as notes without a timestamp.
+    A note's ID is its line number.
+    """
+    def __init__(self, notes_file, index_file, summary_file):
+        self.notes_file = notes_file
+        self.index_file = index_file
+        self.summary_file = summary_file
+        self._lock = threading.Lock()
+        # Built on the first search, then kept up to date by add()
+        self._inverted_index = None
+
+        if not os.path.exists(self.notes_file):
+            with open(self.notes_file, "w") as f:
+                f.write("")
+        self._offsets = self._load_offsets()
+
+    def _load_offsets(self):
+        index = array("Q")
+        if os.path.exists(self.index_file):
+            with open(self.index_file, "rb") as f:
+                data = f.read()
+            if len(data) % index.itemsize == 0:
+                index.frombytes(data)
+            header, offsets = index[:NOTES_INDEX_HEADER_LENGTH], index[NOTES_INDEX_HEADER_LENGTH:]
+            if self._index_matches_notes(header, offsets):
+                return offsets
+        return self._rebuild_index()
+
+    def _notes_file_header(self):
+        stat = os.stat(self.notes_file)
+        return array("Q", [stat.st_size, stat.st_mtime_ns])
+
+    def _write_index_header(self, f):
+        f.seek(0)
+        self._notes_file_header().tofile(f)
+
+    def _index_matches_notes(self, header, offsets):
+        # Any write to the notes file outside the store changes its size or mtime
+        if header != self._notes_file_header():
+            return False
+        # The last indexed note has to start a line and end exactly at the end of the notes file
+        file_size = header[0]
+        if not offsets:
+            return file_size == 0
+        if offsets[-1] >= file_size:
+            return False
+        with open(self.notes_file, "rb") as f:
+            f.seek(max(offsets[-1] - 1, 0))
+            tail = f.read()
+        if offsets[-1] > 0:
+            if tail[:1] != b"\n":
+                return False
+            tail = tail[1:]
+        return tail.endswith(b"\n") and tail.count(b"\n") == 1
+
+    def _rebuild_index(self):
+        offsets = array("Q")
+        position = 0
+        with open(self.notes_file, "rb") as f:
+            for line in f:
+                offsets.append(position)
+                position += len(line)
+        if position and offsets:
+            with open(self.notes_file, "rb") as f:
+                f.seek(position - 1)
+                if f.read(1) != b"\n":
+                    # Terminate a last line written without a newline so appends start on their own line
+                    with open(self.notes_file, "ab") as notes:
+                        notes.write(b"\n")
+        with open(self.index_file, "wb") as f:
+            self._write_index_header(f)
+            offsets.tofile(f)
+        return offsets
+
+    @staticmethod
+    def _parse_line(note_id, line):
+        text = line.decode("utf-8").rstrip("\n")
+        if text.startswith("{"):
+            try:
+                note = json.loads(text)
+                if isinstance(note, dict) and "message" in note:
+                    return {"id": note_id, "timestamp": note.get("timestamp", ""), "message": note["message"]}
+            except json.JSONDecodeError:
+                pass
+        return {"id": note_id, "timestamp": "", "message": text}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def add(self, message):
+        with self._lock:
+            note_id = len(self._offsets)
+            note = {"id": note_id, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "message": message}
+            line = (json.dumps(note, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(self.notes_file, "ab") as f:
+                offset = f.tell()
+                f.write(line)
+            with open(self.index_file, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                array("Q", [offset]).tofile(f)
+                self._write_index_header(f)
+            self._offsets.append(offset)
+            if self._inverted_index is not None:
+                self._index_words(note_id, message)
+            return note
+
+    def get_range(self, start, limit):
+        """Notes start .. start + limit - 1 with a single contiguous read."""
+        with self._lock:
+            start = max(start, 0)
+            end = min(start + limit, len(self._offsets))
+            if start >= end:
+                return []
+            with open(self.notes_file, "rb") as f:
+                f.seek(self._offsets[start])
+                if end < len(self._offsets):
+                    data = f.read(self._offsets[end] - self._offsets[start])
+                else:
+                    data = f.read()
+        lines = data.splitlines(keepends=True)
+        return [self._parse_line(start + index, line) for index, line in enumerate(lines)]
+
+    def get_latest(self):
+        notes = self.get_range(len(self) - 1, 1)
+        return notes[0] if notes else None
+
+    def _index_words(self, note_id, message):
+        for word in set(WORD_PATTERN.findall(message.lower())):
+            self._inverted_index.setdefault(word, []).append(note_id)
+
+    def search(self, query, limit=20):
+        """Most recent notes containing every word of the query."""
+        words = set(WORD_PATTERN.findall(query.lower()))
+        if not words:
+            return []
+        if self._inverted_index is None:
+            self._inverted_index = {}
+            for note in self.get_range(0, len(self)):
+                self._index_words(note["id"], note["message"])
+        postings = [set(self._inverted_index.get(word, [])) for word in words]
+        matching_ids = sorted(set.intersection(*postings), reverse=True)[:limit]
+        notes = []
+        for note_id in matching_ids:
+            notes.extend(self.get_range(note_id, 1))
+        return notes
+
+    def get_last_summarized_id(self):
+        if not os.path.exists(self.summary_file):
+            return -1
+        with open(self.summary_file, "r") as f:
+            return json.load(f).get("last_summarized_id", -1)
+
+    def set_last_summarized_id(self, note_id):
+        with open(self.summary_file, "w") as f:
+            json.dump({"last_summarized_id": note_id}, f)
+
+
+def format_note(note):
+    timestamp = f" {note['timestamp']}" if note["timestamp"] else ""
+    return f"[{note['id']}]{timestamp} {note['message']}"
+
+
+notes_store = NotesStore(NOTES_FILE, NOTES_INDEX_FILE, NOTES_SUMMARY_FILE)
 
-def ensure_file():
-    if not os.path.exists(NOTES_FILE):
-        with open(NOTES_FILE, "w") as f:
-            f.write("")
 # Add an addition tool
 @mcp.tool()
 def add_note(message: str) -> str:
@@ -22,22 +199,30 @@ def add_note(message: str) -> str:
     Returns:
         A success message.
     """
-    ensure_file()
-    with open(NOTES_FILE, "a") as f:
-        f.write(message + "\n")
-    return "Note added successfully"
+    note = notes_store.add(message)
+    return f"Note added successfully (ID {note['id']})"
 
 @mcp.tool()
-def read_notes() -> str:
+def read_notes(start_id: int = -1, limit: int = 50) -> str:
     """
-    Read the notes from the notes file.
+    Read the notes from the notes file, a page at a time.
+    Args:
+        start_id: ID of the first note to read. -1 reads the most recent notes.
+        limit: The maximum number of notes to read.
     Returns:
         The notes from the notes file.
     """
-    ensure_file()   
-    with open(NOTES_FILE, "r") as f:
-        content = f.read().strip()
-    return content or "No notes found"
+    # A page must hold at least one note, or the earlier-notes hint would point back at the same ID
+    limit = max(int(limit), 1)
+    if start_id < 0:
+        start_id = max(len(notes_store) - limit, 0)
+    notes = notes_store.get_range(start_id, limit)
+    if not notes:
+        return "No notes found"
+    content = "\n".join(format_note(note) for note in notes)
+    if start_id > 0:
+        content = f"(Earlier notes: call read_notes with start_id={max(start_id - limit, 0)})\n" + content
+    return content
 
 @mcp.tool()
 def get_latest_note() -> str:
@@ -46,28 +231,46 @@ def get_latest_note() -> str:
     Returns:
         The latest note from the notes file.
     """
-    ensure_file()
-    with open(NOTES_FILE, "r") as f:
-        lines = f.readlines()
-    return lines[-1].strip() if lines else "No notes yet"
+    note = notes_store.get_latest()
+    return format_note(note) if note else "No notes yet"
 
 @mcp.tool()
-def summarize_notes() -> str:
+def search_notes(query: str, limit: int = 20) -> str:
     """
-    Summarize the notes from the notes file.
+    Search the notes for the given keywords.
     Args:
-        notes: The notes to summarize.
+        query: The keywords to search for, notes must contain all of them.
+        limit: The maximum number of notes to return.
+    Returns:
+        The matching notes, most recent first.
+    """
+    notes = notes_store.search(query, limit)
+    if not notes:
+        return "No matching notes"
+    return "\n".join(format_note(note) for note in notes)
+
+@mcp.tool()
+def summarize_notes(window: int = 200, since_id: int = -1) -> str:
+    """
+    Summarize the notes from the notes file, continuing after the notes already summarized.
+    Args:
+        window: The maximum number of notes to summarize in this call.
+        since_id: Summarize the notes after this ID instead of after the last summarized note.
     Returns:
         A summary of the notes.
     """
-    ensure_file()
-    with open(NOTES_FILE, "r") as f:
-        content = f.read().strip()
-
-    if not content:
-        return "No notes yet"
-    
-    return f"Summarize the the following notes: {content}"
+    if since_id < 0:
+        since_id = notes_store.get_last_summarized_id()
+    notes = notes_store.get_range(since_id + 1, window)
+
+    if not notes:
+        return "No notes yet" if len(notes_store) == 0 else "No new notes since the last summary"
+
+    notes_store.set_last_summarized_id(notes[-1]["id"])
+    content = "\n".join(format_note(note) for note in notes)
+    remaining = len(notes_store) - (notes[-1]["id"] + 1)
+    more = f" {remaining} newer notes remain, call summarize_notes again for the next window." if remaining else ""
+    return f"Summarize the the following notes (IDs {notes[0]['id']} to {notes[-1]['id']}):{more} {content}"
 
 
 # Resources and Prompts are not working in Cursor's Claude